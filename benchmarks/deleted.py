@@ -0,0 +1,84 @@
+"""
+Per-request cost of prepare_deleted as deleted.yaml grows.
+
+Compares the handler returned by prepare_deleted, which compiles the
+patterns once, against the previous approach of compiling every pattern
+inside the request:
+
+    python3 -m benchmarks.deleted
+"""
+
+# Standard library
+import os
+import re
+import tempfile
+import timeit
+
+# Packages
+import flask
+import yaml
+from yamlloader import ordereddict
+
+# Local
+from canonicalwebteam.yaml_responses.flask_helpers import prepare_deleted
+from benchmarks.generators import write_deleted_yaml
+
+
+SIZES = [10, 100, 1000, 5000]
+REPEAT = 5
+
+
+def legacy_prepare_deleted(path):
+    """
+    The per-request compiling handler prepare_deleted used to return
+    """
+
+    with open(path) as deleted_file:
+        deleted_urls = yaml.load(deleted_file, Loader=ordereddict.CLoader)
+
+    def _show_deleted():
+        for url_match, context in deleted_urls.items():
+            url_match = str(url_match)
+
+            if url_match[0] != "/":
+                url_match = "/" + url_match
+
+            if re.compile(url_match).fullmatch(flask.request.path):
+                return context or {}
+
+    return _show_deleted
+
+
+def time_per_request(handler, app, url_path, number):
+    with app.test_request_context(url_path):
+        seconds = min(timeit.repeat(handler, number=number, repeat=REPEAT))
+
+    return seconds / number * 1e6
+
+
+def main():
+    app = flask.Flask(__name__)
+
+    print(f"{'rules':>8} {'legacy (us)':>12} {'compiled (us)':>14}")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in SIZES:
+            path = os.path.join(tmp_dir, f"deleted-{size}.yaml")
+            write_deleted_yaml(path, size)
+            number = max(1, 20000 // size)
+
+            legacy = time_per_request(
+                legacy_prepare_deleted(path), app, "/not-deleted", number
+            )
+            compiled = time_per_request(
+                prepare_deleted(path, view_callback=dict),
+                app,
+                "/not-deleted",
+                number,
+            )
+
+            print(f"{size:>8} {legacy:>12.1f} {compiled:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
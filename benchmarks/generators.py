@@ -0,0 +1,106 @@
+"""
+Synthetic rule files for the benchmarks
+"""
+
+# Standard library
+from random import Random
+
+
+def deleted_lines(count):
+    """
+    Yield `count` deleted.yaml lines, one in ten of them a regex path
+    and one in ten with an extra template context
+    """
+
+    for index in range(count):
+        if index % 10 == 0:
+            yield f"section-{index}/.*/old:\n"
+        elif index % 10 == 5:
+            yield f"section-{index}/page:\n  message: Page {index} is gone\n"
+        else:
+            yield f"section-{index}/page:\n"
+
+
+def write_deleted_yaml(path, count):
+    with open(path, "w") as deleted_file:
+        deleted_file.writelines(deleted_lines(count))
+
+
+def redirect_lines(count):
+    """
+    Yield `count` redirects.yaml lines, one in ten of them a regex path
+    and one in ten redirecting to the same archive page
+    """
+
+    for index in range(count):
+        if index % 10 == 0:
+            yield f"section-{index}/(?P<page>.*): /new-{index}/{{page}}\n"
+        elif index % 10 == 5:
+            yield f"section-{index}/page: /archive\n"
+        else:
+            yield f"section-{index}/page: /new-{index}/page\n"
+
+
+def write_redirects_yaml(path, count):
+    with open(path, "w") as redirects_file:
+        redirects_file.writelines(redirect_lines(count))
+
+
+def rule_lines(count, kind):
+    """
+    Yield `count` redirects.yaml lines of a kind: "literal" paths only,
+    "regex" paths only, spread over 100 first path segments, or "mixed"
+    (see redirect_lines)
+    """
+
+    if kind == "mixed":
+        yield from redirect_lines(count)
+        return
+
+    for index in range(count):
+        if kind == "literal":
+            yield f"section-{index}/page: /new-{index}/page\n"
+        else:
+            yield (
+                f"section-{index % 100}/item-{index}/(?P<page>.*): "
+                f"/new-{index}/{{page}}\n"
+            )
+
+
+def write_rules_yaml(path, count, kind):
+    with open(path, "w") as rules_file:
+        rules_file.writelines(rule_lines(count, kind))
+
+
+def request_paths(count, size, kind, hit_ratio, seed=0):
+    """
+    Return `count` request paths for the rules from rule_lines(size,
+    kind), of which about hit_ratio match a rule. The rest miss, but
+    share their first path segment with some rules, so they aren't
+    rejected by the index alone.
+    """
+
+    random = Random(seed)
+    paths = []
+
+    for number in range(count):
+        index = random.randrange(size)
+
+        if kind == "regex":
+            prefix = f"/section-{index % 100}"
+            hit = f"{prefix}/item-{index}/page"
+        else:
+            hit = f"/section-{index}/page"
+
+            # Any path in the sections of mixed regex rules would match
+            if kind == "mixed" and index % 10 == 0:
+                index += 1
+
+            prefix = f"/section-{index}"
+
+        if random.random() < hit_ratio:
+            paths.append(hit)
+        else:
+            paths.append(f"{prefix}/missing-{number}")
+
+    return paths
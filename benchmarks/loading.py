@@ -0,0 +1,124 @@
+"""
+Peak memory while parsing a large rule file.
+
+Forks a fresh process for each parser, and reports how far its resident
+memory rose, and how long it took, to parse a generated 200,000 line
+redirects.yaml. Compares
+core.parse_rules, which streams the top-level mapping from the parser
+one pair at a time, against the previous approach of composing the
+whole document before converting it:
+
+    python3 -m benchmarks.loading
+
+Linux only, as it reads and resets the peak in /proc/self.
+"""
+
+# Standard library
+import os
+import tempfile
+import time
+
+# Packages
+from yamlloader import ordereddict
+
+# Local
+from canonicalwebteam.yaml_responses.core import _plain, parse_rules
+from benchmarks.generators import write_redirects_yaml
+
+SIZE = 200000
+
+
+def legacy_parse_rules(content):
+    """
+    The parse_rules which composed the whole document first
+    """
+
+    loader = ordereddict.CLoader(content)
+
+    try:
+        node = loader.get_single_node()
+        loader.flatten_mapping(node)
+
+        return [
+            (
+                str(loader.construct_object(key_node, deep=True)),
+                _plain(loader.construct_object(value_node, deep=True)),
+                key_node.start_mark.line + 1,
+            )
+            for key_node, value_node in node.value
+        ]
+    finally:
+        loader.dispose()
+
+
+def memory_kib():
+    """
+    The current and peak resident memory of this process
+    """
+
+    status = {}
+
+    with open("/proc/self/status") as status_file:
+        for line in status_file:
+            key, value = line.split(":", 1)
+            status[key] = value
+
+    return int(status["VmRSS"].split()[0]), int(status["VmHWM"].split()[0])
+
+
+def measure(parse, content, write_fd):
+    # Reset the peak to the current resident memory
+    with open("/proc/self/clear_refs", "w") as clear_refs:
+        clear_refs.write("5")
+
+    start = memory_kib()[0]
+    started = time.perf_counter()
+    rules = parse(content)
+    seconds = time.perf_counter() - started
+    peak = memory_kib()[1]
+
+    os.write(write_fd, f"{peak - start} {seconds}".encode())
+    del rules
+    os._exit(0)
+
+
+def fork_measure(parse, content):
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+
+    if not pid:
+        os.close(read_fd)
+        measure(parse, content, write_fd)
+
+    os.close(write_fd)
+
+    with os.fdopen(read_fd) as result:
+        peak, seconds = result.read().split()
+
+    os.waitpid(pid, 0)
+
+    return int(peak) / 1024, float(seconds)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "redirects.yaml")
+        write_redirects_yaml(path, SIZE)
+
+        with open(path, "rb") as redirects_file:
+            content = redirects_file.read()
+
+    print(f"{SIZE} redirects, {len(content) / 2 ** 20:.1f} MiB of YAML")
+    print(f"{'':>10} {'peak (MiB)':>11} {'time (s)':>9}")
+
+    for name, parse in [
+        ("composed", legacy_parse_rules),
+        ("streamed", parse_rules),
+    ]:
+        peak, seconds = fork_measure(parse, content)
+
+        print(f"{name:>10} {peak:>11.1f} {seconds:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
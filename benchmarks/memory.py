@@ -0,0 +1,156 @@
+"""
+Memory used by each forked worker for rules loaded before the fork.
+
+Loads large redirects.yaml and deleted.yaml files in this process,
+as gunicorn does with "preload_app = True", then forks workers which
+each run a full garbage collection and serve some requests, and
+reports the memory private to each worker, with and without calling
+core.prefork() before forking.
+
+In the "segment" case, every rule is a regex under the same first
+path segment, and the requests miss all of them, so each request
+scans every pattern in the segment, or, in the "combined" case, the
+few merged patterns of engine="combined":
+
+    python3 -m benchmarks.memory
+
+Linux only, as it reads /proc/self/smaps_rollup.
+"""
+
+# Standard library
+import gc
+import os
+import tempfile
+
+# Packages
+import flask
+
+# Local
+from canonicalwebteam.yaml_responses.core import prefork
+from canonicalwebteam.yaml_responses.flask_helpers import (
+    prepare_deleted,
+    prepare_redirects,
+)
+from benchmarks.generators import write_deleted_yaml, write_redirects_yaml
+
+
+SIZE = 50000
+WORKERS = 4
+SERVER_WORKERS = 32
+PATHS = ["/section-10/page", "/section-20/old", "/section-5/page", "/missing"]
+SEGMENT_PATHS = ["/docs/missing", "/docs/also-missing"]
+
+
+def write_segment_yaml(path, count):
+    with open(path, "w") as rules_file:
+        rules_file.writelines(
+            f"docs/item-{index}/(?P<page>.*): /new-{index}/{{page}}\n"
+            for index in range(count)
+        )
+
+
+def private_kib():
+    """
+    The memory of this process which isn't shared with any other
+    """
+
+    total = 0
+
+    with open("/proc/self/smaps_rollup") as smaps:
+        for line in smaps:
+            if line.startswith(("Private_Clean:", "Private_Dirty:")):
+                total += int(line.split()[1])
+
+    return total
+
+
+def run_worker(app, handlers, paths, write_fd):
+    start = private_kib()
+    gc.collect()
+
+    for path in paths:
+        with app.test_request_context(path):
+            for handler in handlers:
+                handler()
+
+    os.write(write_fd, str(private_kib() - start).encode())
+    os._exit(0)
+
+
+def fork_workers(app, handlers, paths):
+    """
+    Return the average growth of private memory in forked workers
+    """
+
+    growth = []
+
+    for index in range(WORKERS):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+
+        if not pid:
+            os.close(read_fd)
+            run_worker(app, handlers, paths, write_fd)
+
+        os.close(write_fd)
+
+        with os.fdopen(read_fd) as result:
+            growth.append(int(result.read()))
+
+        os.waitpid(pid, 0)
+
+    return sum(growth) / len(growth)
+
+
+def main():
+    app = flask.Flask(__name__)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        redirects_path = os.path.join(tmp_dir, "redirects.yaml")
+        deleted_path = os.path.join(tmp_dir, "deleted.yaml")
+        segment_path = os.path.join(tmp_dir, "segment.yaml")
+        write_redirects_yaml(redirects_path, SIZE)
+        write_deleted_yaml(deleted_path, SIZE)
+        write_segment_yaml(segment_path, SIZE)
+
+        cases = [
+            (
+                "spread",
+                [
+                    prepare_redirects(redirects_path),
+                    prepare_deleted(deleted_path, view_callback=dict),
+                ],
+                PATHS,
+            ),
+            ("segment", [prepare_redirects(segment_path)], SEGMENT_PATHS),
+            (
+                "combined",
+                [prepare_redirects(segment_path, engine="combined")],
+                SEGMENT_PATHS,
+            ),
+        ]
+
+    print(
+        f"spread: {SIZE} redirects and {SIZE} deleted paths, "
+        f"segment and combined: {SIZE} regex redirects under /docs"
+    )
+    print(
+        f"{'':>10} {'':>8} {'per worker (MiB)':>17} "
+        f"{SERVER_WORKERS:>3} workers"
+    )
+
+    for name in ["default", "prefork"]:
+        if name == "prefork":
+            prefork()
+
+        for case, handlers, paths in cases:
+            growth = fork_workers(app, handlers, paths) / 1024
+
+            print(
+                f"{name:>10} {case:>8} {growth:>17.1f} "
+                f"{growth * SERVER_WORKERS:>11.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Memory held per rule by the redirect and deleted maps.
+
+Compares the Rules in YamlRegexMap and YamlDeletedMap against the
+previous representation, a list of (<regex>, value) tuples, with a new
+dictionary for every deleted path without a context:
+
+    python3 -m benchmarks.rules
+"""
+
+# Standard library
+import gc
+import os
+import re
+import tempfile
+import tracemalloc
+
+# Local
+from canonicalwebteam.yaml_responses.core import load_rules
+from canonicalwebteam.yaml_responses.flask_helpers import (
+    YamlDeletedMap,
+    YamlRegexMap,
+)
+from benchmarks.generators import write_deleted_yaml, write_redirects_yaml
+
+
+SIZE = 50000
+
+
+def legacy_matches(path, default):
+    matches = []
+
+    for url_match, value, line in load_rules(path):
+        if url_match[:1] != "/":
+            url_match = "/" + url_match
+
+        matches.append((re.compile(url_match), value or default()))
+
+    return matches
+
+
+def rules(map_class, path):
+    """
+    The rules of a map, with the file and line of each of them
+    """
+
+    rules_map = map_class(path)
+
+    return rules_map.rules, rules_map.filepaths, rules_map.lines
+
+
+def bytes_per_rule(build, *args):
+    """
+    The memory still allocated once build(*args) has returned,
+    divided by SIZE
+    """
+
+    re.purge()
+    gc.collect()
+    tracemalloc.start()
+    result = build(*args)
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+
+    return size / SIZE
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        redirects_path = os.path.join(tmp_dir, "redirects.yaml")
+        deleted_path = os.path.join(tmp_dir, "deleted.yaml")
+        write_redirects_yaml(redirects_path, SIZE)
+        write_deleted_yaml(deleted_path, SIZE)
+
+        results = [
+            (
+                "redirects",
+                bytes_per_rule(legacy_matches, redirects_path, str),
+                bytes_per_rule(rules, YamlRegexMap, redirects_path),
+            ),
+            (
+                "deleted",
+                bytes_per_rule(legacy_matches, deleted_path, dict),
+                bytes_per_rule(rules, YamlDeletedMap, deleted_path),
+            ),
+        ]
+
+    print(f"Bytes per rule, for {SIZE} rules")
+    print(f"{'':>10} {'tuples':>8} {'Rules':>8}")
+
+    for name, legacy, current in results:
+        print(f"{name:>10} {legacy:>8.0f} {current:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
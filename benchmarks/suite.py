@@ -0,0 +1,311 @@
+"""
+Startup, memory, latency and throughput across rule files and traffic.
+
+For each kind of generated redirects file ("literal", "regex" or
+"mixed", see generators.rule_lines) and each size, measures:
+
+- startup: seconds for prepare_redirects to load the file
+- memory: bytes held by the loaded map
+- for each traffic mix of hits and misses (see TRAFFIC), the latency
+  percentiles of the matcher alone, and of requests through the Flask
+  and Django test clients, along with their requests per second.
+  Django is measured with the single URL pattern from
+  create_redirect_pattern ("django"), and with the URL pattern for
+  each rule from create_redirect_views ("django_views").
+
+Every result is written as a line of JSON, to stdout or --output, so
+the results of two runs can be compared:
+
+    python3 -m benchmarks.suite --output before.jsonl
+    python3 -m benchmarks.suite --output after.jsonl --compare before.jsonl
+
+--compare prints the change in every result, and exits with an error
+if any got worse by more than --threshold (25% by default). The 99th
+percentiles especially vary from run to run, so compare runs on the
+same, otherwise idle, machine.
+"""
+
+# Standard library
+import argparse
+import gc
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Packages
+import django
+import flask
+from django.conf import settings
+from django.test import Client
+from django.urls import clear_url_caches
+
+# Local
+from canonicalwebteam.yaml_responses.django_helpers import (
+    create_redirect_pattern,
+    create_redirect_views,
+)
+from canonicalwebteam.yaml_responses.flask_helpers import prepare_redirects
+from benchmarks.generators import request_paths, write_rules_yaml
+
+KINDS = ["literal", "regex", "mixed"]
+SIZES = [100, 1000, 10000, 100000]
+TRAFFIC = {"hits": 1.0, "misses": 0.0, "mostly-misses": 0.1}
+PERCENTILES = [50, 90, 99]
+
+# Results which are better when higher
+HIGHER_IS_BETTER = {"requests_per_second"}
+
+# The Django URLconf, filled in for each rule file
+urlpatterns = []
+
+
+def result(name, value, unit, **labels):
+    return {"name": name, **labels, "value": value, "unit": unit}
+
+
+def key(record):
+    """
+    What a result measures, to match it with the same result
+    from another run
+    """
+
+    return tuple(
+        (label, value)
+        for label, value in record.items()
+        if label not in ("value", "unit")
+    )
+
+
+def latency_results(name, timings_ns, **labels):
+    """
+    The percentiles of request times in nanoseconds, in microseconds
+    """
+
+    cut_points = statistics.quantiles(timings_ns, n=100)
+
+    return [
+        result(
+            f"{name}.latency_p{percentile}",
+            round(cut_points[percentile - 1] / 1000, 2),
+            "us",
+            **labels,
+        )
+        for percentile in PERCENTILES
+    ]
+
+
+def time_requests(request, paths, repeat=1):
+    """
+    Return the time of each request(path), in nanoseconds, after
+    making a few untimed requests to warm up. With a repeat, each
+    path is requested that many times, for the average time, which
+    is more precise for requests taking around a microsecond.
+    """
+
+    for path in paths[:100]:
+        request(path)
+
+    timings_ns = []
+    repeats = range(repeat)
+
+    for path in paths:
+        started = time.perf_counter_ns()
+
+        for _ in repeats:
+            request(path)
+
+        timings_ns.append((time.perf_counter_ns() - started) / repeat)
+
+    return timings_ns
+
+
+def client_results(name, client, paths, **labels):
+    timings_ns = time_requests(client.get, paths)
+
+    return latency_results(name, timings_ns, **labels) + [
+        result(
+            f"{name}.requests_per_second",
+            round(len(timings_ns) / sum(timings_ns) * 1e9, 1),
+            "requests/s",
+            **labels,
+        )
+    ]
+
+
+def django_results(name, patterns, paths, **labels):
+    """
+    The client results for requests to a Django URLconf
+    of the patterns
+    """
+
+    urlpatterns[:] = patterns
+    clear_url_caches()
+
+    return client_results(name, Client(), paths, **labels)
+
+
+def memory_bytes(build):
+    """
+    The memory still allocated once build() has returned
+    """
+
+    gc.collect()
+    tracemalloc.start()
+    built = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del built
+
+    return size
+
+
+def measure(path, kind, size, arguments):
+    labels = {"kind": kind, "size": size}
+
+    # Measuring the memory first also warms up the loading code
+    options = {"engine": arguments.engine, "lazy": arguments.lazy}
+    memory = memory_bytes(lambda: prepare_redirects(path, **options))
+
+    started = time.perf_counter()
+    apply_redirects = prepare_redirects(path, **options)
+    startup = time.perf_counter() - started
+    redirect_map = apply_redirects.get_redirect_map()
+
+    results = [
+        result("startup", round(startup, 4), "s", **labels),
+        result("memory", memory, "bytes", **labels),
+    ]
+
+    flask_app = flask.Flask(__name__)
+    flask_app.before_request(apply_redirects)
+    flask_client = flask_app.test_client()
+
+    django_patterns = [create_redirect_pattern(path, **options)]
+    django_views = create_redirect_views(path)
+
+    for traffic, hit_ratio in TRAFFIC.items():
+        traffic_labels = {**labels, "traffic": traffic}
+        paths = request_paths(arguments.requests, size, kind, hit_ratio)
+
+        results += latency_results(
+            "matcher",
+            time_requests(redirect_map.first_match, paths, repeat=20),
+            **traffic_labels,
+        )
+        results += client_results(
+            "flask", flask_client, paths, **traffic_labels
+        )
+        results += django_results(
+            "django", django_patterns, paths, **traffic_labels
+        )
+        results += django_results(
+            "django_views", django_views, paths, **traffic_labels
+        )
+
+    return results
+
+
+def compare(results, baseline_path, threshold):
+    """
+    Print the change in each result from the baseline run, returning
+    whether any got worse by more than the threshold
+    """
+
+    with open(baseline_path) as baseline_file:
+        baseline = {
+            key(record): record
+            for record in map(json.loads, baseline_file)
+            if "value" in record
+        }
+
+    regressed = False
+
+    for record in results:
+        before = baseline.get(key(record))
+
+        if not before or not before["value"]:
+            continue
+
+        change = record["value"] / before["value"] - 1
+
+        if record["name"].rsplit(".", 1)[-1] in HIGHER_IS_BETTER:
+            change = -change
+
+        worse = change > threshold
+        regressed = regressed or worse
+        labels = " ".join(str(value) for name, value in key(record))
+
+        print(
+            f"{'WORSE' if worse else '':>5} {change:>+8.1%} {labels}",
+            file=sys.stderr,
+        )
+
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python3 -m benchmarks.suite")
+    parser.add_argument("--kinds", nargs="+", choices=KINDS, default=KINDS)
+    parser.add_argument("--sizes", nargs="+", type=int, default=SIZES)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument(
+        "--engine", choices=["sequential", "combined"], default="sequential"
+    )
+    parser.add_argument(
+        "--lazy",
+        action="store_true",
+        help="Compile each pattern when it's first needed",
+    )
+    parser.add_argument("--output", help="Write the results to this file")
+    parser.add_argument("--compare", metavar="BASELINE")
+    parser.add_argument("--threshold", type=float, default=0.25)
+    arguments = parser.parse_args()
+
+    settings.configure(
+        ROOT_URLCONF=__name__, ALLOWED_HOSTS=["testserver"], MIDDLEWARE=[]
+    )
+    django.setup()
+
+    # Don't log every missed path as "Not Found"
+    logging.getLogger("django.request").setLevel(logging.ERROR)
+
+    results = []
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for kind in arguments.kinds:
+            for size in arguments.sizes:
+                path = os.path.join(tmp_dir, f"{kind}-{size}.yaml")
+                write_rules_yaml(path, size, kind)
+                results += measure(path, kind, size, arguments)
+                os.remove(path)
+
+    environment = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "engine": arguments.engine,
+        "lazy": arguments.lazy,
+        "requests": arguments.requests,
+    }
+    lines = [json.dumps(record) for record in [environment] + results]
+
+    if arguments.output:
+        with open(arguments.output, "w") as output_file:
+            output_file.write("\n".join(lines) + "\n")
+    else:
+        print("\n".join(lines))
+
+    if arguments.compare:
+        return int(compare(results, arguments.compare, arguments.threshold))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
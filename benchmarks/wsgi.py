@@ -0,0 +1,98 @@
+"""
+Requests per second served by the WSGI middleware.
+
+Sends the same mix of redirected, deleted and unmatched paths through
+a Flask app using prepare_responses as a before_request function, and
+through the same app wrapped in wsgi_helpers.YamlResponsesMiddleware,
+calling each as a WSGI server would:
+
+    python3 -m benchmarks.wsgi
+"""
+
+# Standard library
+import os
+import tempfile
+import timeit
+
+# Packages
+import flask
+
+# Local
+from canonicalwebteam.yaml_responses.flask_helpers import prepare_responses
+from canonicalwebteam.yaml_responses.wsgi_helpers import (
+    YamlResponsesMiddleware,
+)
+from benchmarks.generators import write_deleted_yaml, write_redirects_yaml
+
+SIZE = 5000
+NUMBER = 20000
+REPEAT = 5
+PATHS = {
+    "redirect": "/section-20/page-20",
+    "deleted": "/section-12/page",
+    "not found": "/missing",
+}
+
+
+def start_response(status, headers):
+    pass
+
+
+def requests_per_second(application, url_path):
+    environ = {
+        "REQUEST_METHOD": "GET",
+        "SCRIPT_NAME": "",
+        "PATH_INFO": url_path,
+        "QUERY_STRING": "",
+        "SERVER_NAME": "localhost",
+        "SERVER_PORT": "80",
+        "SERVER_PROTOCOL": "HTTP/1.1",
+        "wsgi.url_scheme": "http",
+    }
+
+    def request():
+        for chunk in application(dict(environ), start_response):
+            pass
+
+    seconds = min(timeit.repeat(request, number=NUMBER, repeat=REPEAT))
+
+    return NUMBER / seconds
+
+
+def main():
+    app = flask.Flask(__name__)
+
+    @app.route("/missing")
+    def missing():
+        return "not found"
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # Deleted paths first, as the generated redirects cover them
+        sources = [
+            (os.path.join(tmp_dir, "deleted.yaml"), 410),
+            (os.path.join(tmp_dir, "redirects.yaml"), 302),
+        ]
+        write_deleted_yaml(sources[0][0], SIZE)
+        write_redirects_yaml(sources[1][0], SIZE)
+
+        flask_app = flask.Flask(__name__)
+        flask_app.add_url_rule("/missing", view_func=missing)
+        flask_app.before_request(
+            prepare_responses(
+                [sources[0] + (lambda context: ("", 410),), sources[1]]
+            )
+        )
+        middleware = YamlResponsesMiddleware(app.wsgi_app, sources)
+
+    print(f"{SIZE} redirects and {SIZE} deleted paths, requests per second")
+    print(f"{'path':>10} {'flask':>10} {'middleware':>11}")
+
+    for name, url_path in PATHS.items():
+        flask_rps = requests_per_second(flask_app.wsgi_app, url_path)
+        middleware_rps = requests_per_second(middleware, url_path)
+
+        print(f"{name:>10} {flask_rps:>10.0f} {middleware_rps:>11.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+# Standard library
+import sys
+
+# Local
+from canonicalwebteam.yaml_responses.cli import main
+
+
+sys.exit(main())
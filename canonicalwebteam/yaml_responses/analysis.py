@@ -0,0 +1,162 @@
+# Standard library
+import os
+from urllib.parse import urlparse
+
+# Local
+from canonicalwebteam.yaml_responses.core import (
+    ResponsesMap,
+    is_literal,
+    load_rules,
+    rule_file_paths,
+    write_rules,
+)
+
+
+def _local_path(url):
+    """
+    The path of a URL on the same site, or None for other sites
+    """
+
+    if url.startswith("/") and not url.startswith("//"):
+        return urlparse(url).path
+
+
+class RulesAnalysis(ResponsesMap):
+    def __init__(self, sources, max_hops=20):
+        """
+        Find the rules in a list of (path, status) sources, as for
+        core.ResponsesMap, which only slow matching down or cost
+        clients extra requests, given that the first matching rule
+        wins:
+
+        - duplicates: (index, first) for each rule with the same path
+          as an earlier one, in another file
+        - shadowed: (index, by) for each path without RegEx characters
+          which an earlier, broader, rule matches
+        - chains: (index, hops, target_url) for each redirect to a path
+          on the same site which is redirected again, with the rules
+          for the later hops and the URL at the end of the chain, or
+          None when the chain ends at a deleted path
+        - loops: (index, hops) for each redirect which leads back to
+          a rule already in its chain
+
+        Rules are given by their index in self.rules, and
+        self.location(index) gives the file and line of each of them.
+
+        Only redirects whose target doesn't depend on the request's
+        path are followed, for at most max_hops. Paths with RegEx
+        characters can't be checked for shadowing, except for exact
+        duplicates.
+        """
+
+        self.sources = list(sources)
+
+        super().__init__(self.sources)
+
+        self.duplicates = []
+        self.shadowed = []
+        self.chains = []
+        self.loops = []
+
+        firsts = {}
+
+        for index, rule in enumerate(self.rules):
+            first = firsts.setdefault(rule.pattern.pattern, index)
+
+            if first != index:
+                self.duplicates.append((index, first))
+                continue
+
+            if is_literal(rule.pattern.pattern):
+                first_match = self.first_match(rule.pattern.pattern)
+
+                if first_match[0] != index:
+                    self.shadowed.append((index, first_match[0]))
+                    continue
+
+            if rule.status != 410:
+                self._follow(index, max_hops)
+
+    def _follow(self, index, max_hops):
+        template = self.templates[self.rules[index].target]
+
+        if template.pieces is None or len(template.pieces) > 1:
+            return
+
+        target_url = template.render({})
+        hops = []
+
+        while len(hops) < max_hops:
+            url_path = _local_path(target_url)
+            first_match = url_path and self.first_match(url_path)
+
+            if not first_match:
+                break
+
+            next_index, next_rule, groups = first_match
+
+            if next_index == index or next_index in hops:
+                self.loops.append((index, hops + [next_index]))
+                return
+
+            hops.append(next_index)
+
+            if next_rule.status == 410:
+                target_url = None
+                break
+
+            target_url = self.target_url(
+                next_rule, groups, urlparse(target_url).query
+            )
+
+        if hops:
+            self.chains.append((index, hops, target_url))
+
+    def optimized_rules(self, filepath):
+        """
+        Return the (path, value, line) triples from one of the files,
+        without its duplicated or shadowed paths, and with chains of
+        redirects which end at a URL collapsed into a single hop
+        """
+
+        removed = {
+            self.location(index)
+            for index, first in self.duplicates + self.shadowed
+        }
+        targets = {
+            self.location(index): target_url
+            for index, hops, target_url in self.chains
+            if target_url is not None
+        }
+
+        return [
+            (url_path, targets.get((filepath, line), value), line)
+            for url_path, value, line in load_rules(filepath)
+            if (filepath, line) not in removed
+        ]
+
+    def write_optimized(self, output_dir):
+        """
+        Write the optimized rules from every file of the sources into
+        output_dir, with the same file names, returning their paths
+        """
+
+        filepaths = [
+            filepath
+            for source, status in self.sources
+            for filepath in rule_file_paths(source)
+        ]
+        names = [os.path.basename(filepath) for filepath in filepaths]
+
+        if len(set(names)) < len(names):
+            raise ValueError("Rule files to optimize must have unique names")
+
+        os.makedirs(output_dir, exist_ok=True)
+        written = []
+
+        for filepath, name in zip(filepaths, names):
+            output_path = os.path.join(output_dir, name)
+            write_rules(output_path, self.optimized_rules(filepath))
+            written.append(output_path)
+
+        return written
@@ -0,0 +1,190 @@
+# Standard library
+import asyncio
+import time
+
+# Local
+from canonicalwebteam.yaml_responses.core import (
+    FileReloader,
+    ResponsesMap,
+    quote_location,
+)
+
+
+class AsyncFileReloader(FileReloader):
+    """
+    A FileReloader for use from an event loop. get_async() checks the
+    files, and rebuilds the object, in the loop's default executor,
+    so the loop is never blocked by file reading, YAML parsing or
+    regex compiling.
+
+    The new object is swapped in with a single assignment once it's
+    fully built, so requests always see either the old or the new one.
+    """
+
+    def __init__(self, path, build, interval=10):
+        self.future = None
+
+        super().__init__(path, build, interval)
+
+    async def get_async(self):
+        if time.monotonic() >= self._next_check:
+            await self.check_async()
+
+        return self.current
+
+    async def check_async(self):
+        """
+        Start a reload in the executor if the file has changed
+        since the last one
+        """
+
+        if self._reloading or time.monotonic() < self._next_check:
+            return
+
+        # Nothing else runs in the loop until the next await,
+        # so this is enough to stop concurrent checks
+        self._next_check = time.monotonic() + self.interval
+        self._reloading = True
+
+        loop = asyncio.get_running_loop()
+
+        try:
+            signature = await loop.run_in_executor(None, self._stat)
+        except BaseException:
+            # e.g. the request was cancelled, so let the next one check
+            self._reloading = False
+            raise
+
+        if signature == self._signature:
+            self._reloading = False
+            return
+
+        self.future = loop.run_in_executor(None, self.reload, signature)
+
+
+async def _deleted_response(scope, receive, send, context):
+    body = str(context.get("message", "Gone")).encode("utf-8")
+
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 410,
+            "headers": [
+                (b"content-type", b"text/plain; charset=utf-8"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+class YamlResponsesMiddleware:
+    def __init__(
+        self,
+        app,
+        sources=(("redirects.yaml", 302), ("deleted.yaml", 410)),
+        view_callback=_deleted_response,
+        engine="sequential",
+        cache_size=0,
+        reload_interval=None,
+        cache_dir=None,
+        instrument=None,
+        max_path_length=None,
+        lazy=False,
+    ):
+        """
+        ASGI middleware which serves redirects and deleted paths, from
+        a list of (path, status) YAML files as for the Flask
+        prepare_responses, in front of any ASGI app:
+
+            application = YamlResponsesMiddleware(
+                application,
+                [
+                    ("redirects.yaml", 302),
+                    ("permanent-redirects.yaml", 301),
+                    ("deleted.yaml", 410),
+                ],
+            )
+
+        The path and query string are read straight from the scope,
+        so matching requests never reach the app. Other requests, and
+        anything other than HTTP, are passed on to the app unchanged.
+
+        Deleted paths return a plain text 410 response, with the
+        "message" from the context if there is one. For anything else,
+        pass a view_callback, an async function which is called as
+        view_callback(scope, receive, send, context), like an ASGI app.
+
+        The rules are first loaded when the middleware is created.
+        With a reload_interval, later reloads run in the event loop's
+        default executor (see AsyncFileReloader).
+
+        The engine, cache_size, cache_dir, instrument, max_path_length
+        and lazy options work as for the Flask prepare_redirects.
+        """
+
+        sources = list(sources)
+        options = {
+            "engine": engine,
+            "cache_size": cache_size,
+            "cache_dir": cache_dir,
+            "instrument": instrument,
+            "max_path_length": max_path_length,
+            "lazy": lazy,
+        }
+
+        self.app = app
+        self.view_callback = view_callback
+        self.reloader = None
+
+        if reload_interval is None:
+            self.responses_map = ResponsesMap(sources, **options)
+        else:
+            self.reloader = AsyncFileReloader(
+                [filepath for filepath, status in sources],
+                lambda paths: ResponsesMap(sources, **options),
+                reload_interval,
+            )
+
+    async def get_responses_map(self):
+        if self.reloader is None:
+            return self.responses_map
+
+        return await self.reloader.get_async()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        responses_map = await self.get_responses_map()
+        first_match = responses_map.first_match(scope["path"] or "/")
+
+        if not first_match:
+            return await self.app(scope, receive, send)
+
+        index, rule, groups = first_match
+
+        if rule.status == 410:
+            return await self.view_callback(
+                scope, receive, send, dict(rule.context)
+            )
+
+        target_url = responses_map.target_url(
+            rule,
+            groups,
+            scope.get("query_string", b"").decode("utf-8", "replace"),
+        )
+
+        location = quote_location(target_url).encode("latin-1")
+
+        await send(
+            {
+                "type": "http.response.start",
+                "status": rule.status,
+                "headers": [
+                    (b"location", location),
+                    (b"content-length", b"0"),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": b""})
@@ -0,0 +1,248 @@
+# Standard library
+import argparse
+import os
+import sys
+
+# Local
+from canonicalwebteam.yaml_responses.analysis import RulesAnalysis
+from canonicalwebteam.yaml_responses.core import (
+    InvalidRulesError,
+    load_rules,
+    rules_parser,
+    validate_rules,
+    write_cache,
+    write_rules,
+)
+
+
+def build_cache(arguments):
+    """
+    Parse each rule file and store the rules in the cache directory,
+    e.g. while building an image, so the app doesn't parse them
+    when it starts
+    """
+
+    for path in arguments.files:
+        with open(path, "rb") as rules_file:
+            content = rules_file.read()
+
+        cache_path = write_cache(
+            arguments.cache_dir, content, rules_parser(path)(content)
+        )
+
+        if not cache_path:
+            print(f"{path}: can't be cached", file=sys.stderr)
+            return 1
+
+        print(f"{path} -> {cache_path}")
+
+    return 0
+
+
+def convert(arguments):
+    """
+    Write the rules from one rule file to another, in the format given
+    by the extension of the new file, so rules can be written in YAML
+    and shipped in a format which is faster to load
+    """
+
+    if not os.path.isfile(arguments.source):
+        print(f"{arguments.source}: no such file", file=sys.stderr)
+        return 1
+
+    try:
+        write_rules(arguments.destination, load_rules(arguments.source))
+    except (TypeError, ValueError) as error:
+        print(
+            f"{arguments.source}: can't be converted: {error}", file=sys.stderr
+        )
+        return 1
+
+    print(f"{arguments.source} -> {arguments.destination}")
+
+    return 0
+
+
+def validate(arguments):
+    """
+    Report every path in the rule files which isn't a valid pattern,
+    and optionally any which could backtrack catastrophically, e.g. in
+    CI, failing if there are any
+    """
+
+    errors = validate_rules(
+        arguments.files,
+        processes=arguments.jobs,
+        backtracking=arguments.check_backtracking,
+    )
+
+    for filepath, line, url_path, message in errors:
+        print(f"{filepath}:{line}: {url_path}: {message}", file=sys.stderr)
+
+    return 1 if errors else 0
+
+
+def _source(source):
+    """
+    A (path, status) source from "PATH" or "PATH:STATUS"
+    """
+
+    path, separator, status = source.rpartition(":")
+
+    if separator and status.isdigit():
+        return path, int(status)
+
+    return source, 302
+
+
+def _location(analysis, index):
+    filepath, line = analysis.location(index)
+
+    return f"{filepath}:{line}"
+
+
+def _describe(analysis, index):
+    return (
+        f"{_location(analysis, index)}: "
+        f"{analysis.rules[index].pattern.pattern}"
+    )
+
+
+def analyze(arguments):
+    """
+    Report the rules which can never match, or which send clients
+    through more than one redirect, and optionally write out the files
+    without them, e.g. to clean up rule files which have grown
+    over the years
+    """
+
+    try:
+        analysis = RulesAnalysis(
+            arguments.sources, max_hops=arguments.max_hops
+        )
+    except InvalidRulesError as error:
+        for filepath, line, url_path, message in error.errors:
+            print(f"{filepath}:{line}: {url_path}: {message}", file=sys.stderr)
+
+        return 1
+
+    for index, first in analysis.duplicates:
+        print(
+            f"{_describe(analysis, index)}: "
+            f"duplicate of {_location(analysis, first)}"
+        )
+
+    for index, by in analysis.shadowed:
+        print(
+            f"{_describe(analysis, index)}: "
+            f"shadowed by {analysis.rules[by].pattern.pattern} "
+            f"at {_location(analysis, by)}"
+        )
+
+    for index, hops, target_url in analysis.chains:
+        print(
+            f"{_describe(analysis, index)}: "
+            f"chain of {len(hops) + 1} hops through "
+            + ", ".join(_location(analysis, hop) for hop in hops)
+            + (f" to {target_url}" if target_url else " to a deleted path")
+        )
+
+    for index, hops in analysis.loops:
+        print(
+            f"{_describe(analysis, index)}: loop through "
+            + ", ".join(_location(analysis, hop) for hop in hops)
+        )
+
+    if arguments.output_dir:
+        for output_path in analysis.write_optimized(arguments.output_dir):
+            print(f"Wrote {output_path}", file=sys.stderr)
+
+    findings = (
+        analysis.duplicates
+        + analysis.shadowed
+        + analysis.chains
+        + analysis.loops
+    )
+
+    return 1 if arguments.check and findings else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python3 -m canonicalwebteam.yaml_responses",
+        description="Tools for redirects.yaml and deleted.yaml files",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build_cache_parser = commands.add_parser(
+        "build-cache", help="Store parsed rule files in a cache directory"
+    )
+    build_cache_parser.add_argument(
+        "--cache-dir",
+        required=True,
+        help="The cache_dir the app passes to the helpers",
+    )
+    build_cache_parser.add_argument("files", nargs="+", metavar="FILE")
+    build_cache_parser.set_defaults(function=build_cache)
+
+    convert_parser = commands.add_parser(
+        "convert",
+        help="Convert a rule file to YAML, JSON Lines or precompiled rules",
+        description=(
+            "The format of the new file is chosen by its extension: "
+            ".jsonl for JSON Lines, .rules for precompiled rules, "
+            "or YAML otherwise"
+        ),
+    )
+    convert_parser.add_argument("source", metavar="SOURCE")
+    convert_parser.add_argument("destination", metavar="DESTINATION")
+    convert_parser.set_defaults(function=convert)
+
+    validate_parser = commands.add_parser(
+        "validate",
+        help="Check every path in rule files is a valid pattern",
+    )
+    validate_parser.add_argument(
+        "--jobs",
+        type=int,
+        help="The number of processes compiling patterns, all CPUs if unset",
+    )
+    validate_parser.add_argument(
+        "--check-backtracking",
+        action="store_true",
+        help="Also report patterns which could backtrack catastrophically",
+    )
+    validate_parser.add_argument("files", nargs="+", metavar="FILE")
+    validate_parser.set_defaults(function=validate)
+
+    analyze_parser = commands.add_parser(
+        "analyze",
+        help="Find duplicated, shadowed, chained and looping rules",
+        description=(
+            "Each SOURCE is a rule file, directory or glob, with the "
+            "status of its responses, e.g. redirects.yaml:301 or "
+            "deleted.yaml:410, 302 if unset, in the order the app "
+            "passes them to the helpers"
+        ),
+    )
+    analyze_parser.add_argument(
+        "--output-dir",
+        help=(
+            "Write the files here without duplicated or shadowed rules, "
+            "and with chains of redirects collapsed into a single hop"
+        ),
+    )
+    analyze_parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Exit with an error if anything was found",
+    )
+    analyze_parser.add_argument("--max-hops", type=int, default=20)
+    analyze_parser.add_argument(
+        "sources", nargs="+", type=_source, metavar="SOURCE"
+    )
+    analyze_parser.set_defaults(function=analyze)
+
+    arguments = parser.parse_args(argv)
+
+    return arguments.function(arguments)
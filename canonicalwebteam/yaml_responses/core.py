@@ -0,0 +1,1831 @@
+# Standard library
+import gc
+import glob
+import hashlib
+import json
+import logging
+import marshal
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import islice
+from string import Formatter
+from types import MappingProxyType
+from urllib.parse import quote, urlparse
+
+# Packages
+import yaml
+from yaml.composer import Composer, ComposerError
+from yaml.events import MappingEndEvent, MappingStartEvent, StreamEndEvent
+from yamlloader import ordereddict
+
+logger = logging.getLogger(__name__)
+
+_GLOBAL_FLAGS = re.compile(r"\(\?[aiLmsux]+\)")
+_LITERAL = re.compile(r"[^.^$*+?{}\[\]\\|()]*")
+_PREFIX = re.compile(r"/([^.^$*+?{}\[\]\\|()/]+)(?:/(?![?*{])|/\?\Z)")
+_URL_START = re.compile(
+    r"/(?:[^/{]|\Z)|[a-z][a-z0-9+.-]*://[\w.:%-]+(?:[/?]|\Z)", re.ASCII
+)
+_GLOB_MAGIC = re.compile(r"[*?[]")
+# Quantifiers which can repeat what comes before them more than once
+_REPEAT = re.compile(r"[*+]\??|\{\d*,\d*\}\??")
+_REPEATED_GROUP = re.compile(r"\)[*+{]")
+_GROUP_PREFIX = re.compile(r"\(\?(?:P<\w+>|<?[=!]|[aiLmsux-]*:|>)|\(")
+# Matches nothing, in place of lazy patterns which failed to compile
+_NEVER = re.compile(r"(?!)")
+# Held while compiling lazy patterns and building deferred engines
+_COMPILE_LOCK = threading.RLock()
+_URL_UNSAFE = re.compile(r"[?#;\x00-\x20\x7f]")
+# Characters which can't be sent as they are in Location headers
+_LOCATION_UNSAFE = re.compile(r"[^\x21-\x7e]")
+# Characters left as they are in Location headers
+_LOCATION_SAFE = "/:?#[]@!$&'()*+,;=%~"
+
+
+# The statuses a rule can have, other than 410 for deleted paths
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+
+# The context of every rule without one
+EMPTY_CONTEXT = MappingProxyType({})
+
+MAPPING_TAG = "tag:yaml.org,2002:map"
+MERGE_TAG = "tag:yaml.org,2002:merge"
+
+# Bump whenever the format of the cached rules changes
+CACHE_VERSION = 2
+RULE_EXTENSIONS = (".yaml", ".yml", ".jsonl", ".rules")
+BINARY_HEADER = b"yaml-responses %d %d\n" % (CACHE_VERSION, marshal.version)
+
+
+def _plain(value):
+    """
+    Turn the OrderedDicts from the YAML loader into plain dicts,
+    which marshal can store
+    """
+
+    if isinstance(value, dict):
+        return {key: _plain(item) for key, item in value.items()}
+
+    if isinstance(value, list):
+        return [_plain(item) for item in value]
+
+    return value
+
+
+class _RulesLoader(ordereddict.CLoader, Composer):
+    """
+    The C loader, along with the pure Python composer's methods for
+    composing a single node at a time from the C parser's events
+    """
+
+    def __init__(self, content):
+        super().__init__(content)
+        self.anchors = {}
+
+
+class _NotStreamable(Exception):
+    """
+    A rule file which parse_rules can't read one pair at a time
+    """
+
+
+def _composed_pairs(loader):
+    """
+    Yield the (key, value) nodes of the top-level mapping, composing
+    the whole document first
+    """
+
+    node = loader.get_single_node()
+
+    if node is not None:
+        loader.flatten_mapping(node)
+        yield from node.value
+
+
+def _streamed_pairs(loader):
+    """
+    Yield the (key, value) nodes of the top-level mapping, composing
+    each pair from the parser's events as it's reached, so the nodes
+    for the whole document never exist at once
+    """
+
+    loader.get_event()
+
+    if loader.check_event(StreamEndEvent):
+        return
+
+    document_event = loader.get_event()
+    mapping_event = loader.peek_event()
+
+    if (
+        not isinstance(mapping_event, MappingStartEvent)
+        or mapping_event.anchor is not None
+        or mapping_event.tag not in (None, "!", MAPPING_TAG)
+    ):
+        raise _NotStreamable()
+
+    loader.get_event()
+
+    while not loader.check_event(MappingEndEvent):
+        key_node = loader.compose_node(None, None)
+
+        # Merged pairs go before all the others (see flatten_mapping)
+        if key_node.tag == MERGE_TAG:
+            raise _NotStreamable()
+
+        yield key_node, loader.compose_node(None, None)
+
+    loader.get_event()
+    loader.get_event()
+
+    if not loader.check_event(StreamEndEvent):
+        raise ComposerError(
+            "expected a single document in the stream",
+            document_event.start_mark,
+            "but found another document",
+            loader.get_event().start_mark,
+        )
+
+
+def _unique_rules(rules):
+    """
+    Return a list of (path, value, line) triples without repeated paths.
+    Like a dictionary, a repeated path keeps its first position and
+    takes its last value
+    """
+
+    positions = {}
+    unique_rules = []
+
+    for rule in rules:
+        if rule[0] in positions:
+            unique_rules[positions[rule[0]]] = rule
+        else:
+            positions[rule[0]] = len(unique_rules)
+            unique_rules.append(rule)
+
+    return unique_rules
+
+
+def _read_pairs(content, read_pairs):
+    loader = _RulesLoader(content)
+
+    def rules():
+        for key_node, value_node in read_pairs(loader):
+            key = str(loader.construct_object(key_node, deep=True))
+            value = _plain(loader.construct_object(value_node, deep=True))
+            loader.constructed_objects.clear()
+
+            yield key, value, key_node.start_mark.line + 1
+
+    try:
+        return _unique_rules(rules())
+    finally:
+        loader.dispose()
+
+
+def parse_rules(content):
+    """
+    Parse the content of a YAML rule file into a list of
+    (path, value, line) triples, where line is the line number
+    of the path in the file
+
+    The top-level mapping is read from the parser one pair at a time.
+    Files which need the whole document first, with a top-level merge
+    key or which aren't a plain mapping, are composed in full instead.
+    """
+
+    try:
+        return _read_pairs(content, _streamed_pairs)
+    except _NotStreamable:
+        return _read_pairs(content, _composed_pairs)
+
+
+def parse_json_lines(content):
+    """
+    Parse the content of a JSON Lines rule file, with a [path, value]
+    array on each line, into (path, value, line) triples:
+
+        ["hello", "/world"]
+        ["deleted/with/message", {"message": "Gone"}]
+    """
+
+    def rules():
+        for line, text in enumerate(content.splitlines(), start=1):
+            if text.strip():
+                path, value = json.loads(text)
+
+                yield str(path), value, line
+
+    return _unique_rules(rules())
+
+
+def parse_binary_rules(content):
+    """
+    Read the (path, value, line) triples from a precompiled rule file,
+    written by write_rules
+    """
+
+    header, newline, data = content.partition(b"\n")
+
+    if header + newline != BINARY_HEADER:
+        raise ValueError(
+            "Not a precompiled rule file for this version, "
+            "convert the source file again"
+        )
+
+    return marshal.loads(data)
+
+
+def rules_parser(filepath):
+    """
+    The function which parses the content of a rule file, by extension
+    """
+
+    extension = os.path.splitext(filepath)[1]
+
+    if extension == ".rules":
+        return parse_binary_rules
+
+    if extension == ".jsonl":
+        return parse_json_lines
+
+    return parse_rules
+
+
+def write_rules(filepath, rules):
+    """
+    Write (path, value, line) triples to a rule file, as JSON Lines
+    for a .jsonl path, precompiled for a .rules path, or YAML otherwise
+    """
+
+    extension = os.path.splitext(filepath)[1]
+
+    if extension == ".rules":
+        data = BINARY_HEADER + marshal.dumps(list(rules))
+    elif extension == ".jsonl":
+        data = "".join(
+            json.dumps([path, value], ensure_ascii=False) + "\n"
+            for path, value, line in rules
+        ).encode("utf-8")
+    else:
+        data = yaml.dump(
+            {path: value for path, value, line in rules},
+            Dumper=ordereddict.CSafeDumper,
+            allow_unicode=True,
+            default_flow_style=False,
+            sort_keys=False,
+        ).encode("utf-8")
+
+    with open(filepath, "wb") as rules_file:
+        rules_file.write(data)
+
+
+def cache_path(cache_dir, content):
+    """
+    The path of the cached rules for the content of a rule file,
+    which changes along with the content, the Python version and
+    the cache format
+    """
+
+    digest = hashlib.sha256(content).hexdigest()
+    tag = sys.implementation.cache_tag
+
+    return os.path.join(cache_dir, f"{digest}.{tag}-{CACHE_VERSION}.rules")
+
+
+def write_cache(cache_dir, content, rules):
+    """
+    Store parsed rules in the cache directory, returning the path of
+    the cache file, or None when the rules can't be stored
+    """
+
+    try:
+        data = marshal.dumps(rules)
+    except ValueError:
+        logger.warning(
+            "Can't cache rules containing values other than basic types"
+        )
+        return None
+
+    os.makedirs(cache_dir, exist_ok=True)
+    file_descriptor, tmp_path = tempfile.mkstemp(dir=cache_dir)
+
+    with os.fdopen(file_descriptor, "wb") as tmp_file:
+        tmp_file.write(data)
+
+    path = cache_path(cache_dir, content)
+    os.replace(tmp_path, path)
+
+    return path
+
+
+def load_rules(filepath, cache_dir=None):
+    """
+    Read the (path, value, line) triples, in order, from a YAML file
+    of rules:
+
+        hello: /world
+        example-(?P<name>.*): http://example.com/{name}
+
+    Files ending in .jsonl are read as JSON Lines (see
+    parse_json_lines), and files ending in .rules as precompiled rules
+    (see "python3 -m canonicalwebteam.yaml_responses convert").
+
+    Returns an empty list for missing or empty files.
+
+    With a cache_dir, the parsed rules are stored there, keyed by a
+    hash of the file's content, so the next load of the same content
+    skips parsing the YAML (see "python3 -m
+    canonicalwebteam.yaml_responses build-cache").
+    """
+
+    if not os.path.isfile(filepath):
+        return []
+
+    with open(filepath, "rb") as rules_file:
+        content = rules_file.read()
+
+    parse = rules_parser(filepath)
+
+    if not cache_dir or parse is parse_binary_rules:
+        return parse(content)
+
+    try:
+        with open(cache_path(cache_dir, content), "rb") as cache_file:
+            return marshal.load(cache_file)
+    except (OSError, EOFError, ValueError, TypeError):
+        pass
+
+    rules = parse(content)
+
+    try:
+        write_cache(cache_dir, content, rules)
+    except OSError:
+        logger.warning("Can't write rules cache to %s", cache_dir)
+
+    return rules
+
+
+def rule_file_paths(path):
+    """
+    Return the rule files for a path, in a fixed order. The path can be
+    a single file, a directory, for each of the rule files directly in
+    it, a glob pattern, or a list of any of those:
+
+        ["redirects.yaml", "redirects.d", "sections/*/redirects.yaml"]
+
+    Files in a directory or matching a glob are sorted by path.
+    """
+
+    if isinstance(path, (list, tuple)):
+        paths = [
+            filepath for item in path for filepath in rule_file_paths(item)
+        ]
+
+        return list(dict.fromkeys(paths))
+
+    path = os.fspath(path)
+
+    if os.path.isdir(path):
+        return sorted(
+            os.path.join(path, name)
+            for name in os.listdir(path)
+            if name.endswith(RULE_EXTENSIONS)
+            and os.path.isfile(os.path.join(path, name))
+        )
+
+    if _GLOB_MAGIC.search(path) and not os.path.exists(path):
+        return sorted(glob.glob(path))
+
+    return [path]
+
+
+def watched_paths(path):
+    """
+    The paths to check for changes to the rule files for a path (see
+    rule_file_paths): the files themselves, and the directories
+    searched for them, which change when files are added or removed
+    """
+
+    if isinstance(path, (list, tuple)):
+        paths = [watched for item in path for watched in watched_paths(item)]
+
+        return list(dict.fromkeys(paths))
+
+    path = os.fspath(path)
+
+    if os.path.isdir(path):
+        return [path] + rule_file_paths(path)
+
+    if _GLOB_MAGIC.search(path) and not os.path.exists(path):
+        # The deepest directory without any glob characters
+        directory = _GLOB_MAGIC.split(path, 1)[0].rpartition(os.sep)[0]
+
+        return [directory or os.curdir] + rule_file_paths(path)
+
+    return [path]
+
+
+class LazyPattern:
+    """
+    A RegEx source which is only compiled the first time it's needed,
+    in place of a compiled pattern, for rules loaded with lazy=True.
+
+    It has the attributes of a compiled pattern which the matchers use,
+    and fullmatch. Compiling is done once, under a lock, however many
+    threads need the pattern at the same time. A source which isn't a
+    valid pattern is logged and never matches, as it can no longer be
+    reported when the rules are loaded.
+    """
+
+    __slots__ = ("pattern", "_compiled")
+
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self._compiled = None
+
+    def __repr__(self):
+        return f"LazyPattern({self.pattern!r})"
+
+    def compile(self):
+        """
+        Return the compiled pattern, compiling it if it hasn't been
+        """
+
+        if self._compiled is None:
+            with _COMPILE_LOCK:
+                if self._compiled is None:
+                    try:
+                        self._compiled = re.compile(self.pattern)
+                    except re.error as error:
+                        logger.error(
+                            "Invalid pattern %s: %s", self.pattern, error
+                        )
+                        self._compiled = _NEVER
+
+        return self._compiled
+
+    def fullmatch(self, string):
+        return (self._compiled or self.compile()).fullmatch(string)
+
+    @property
+    def flags(self):
+        # Literal sources can't have inline flags, and never need
+        # compiling, as they're matched by dictionary lookups
+        if self._compiled is None and is_literal(self.pattern):
+            return re.UNICODE
+
+        return self.compile().flags
+
+    @property
+    def groups(self):
+        return self.compile().groups
+
+    @property
+    def groupindex(self):
+        return self.compile().groupindex
+
+
+class Rule:
+    """
+    A compiled path pattern, with what to respond with when it matches:
+    a target URL template for redirects, or a template context for
+    deleted paths, and the status code.
+
+    The target or context is held in a single value slot, so a Rule
+    is no larger than a (pattern, value, status) tuple. Rules without
+    a context, or with an empty one, share EMPTY_CONTEXT. Where a rule
+    came from is kept by the map holding it (see ResponsesMap.location).
+    """
+
+    __slots__ = ("pattern", "value", "status")
+
+    def __init__(self, pattern, target=None, status=None, context=None):
+        self.pattern = pattern
+        self.status = status
+        self.value = (context or EMPTY_CONTEXT) if status == 410 else target
+
+    @property
+    def target(self):
+        return None if self.status == 410 else self.value
+
+    @property
+    def context(self):
+        return self.value if self.status == 410 else EMPTY_CONTEXT
+
+    def __repr__(self):
+        return f"<Rule {self.pattern.pattern!r} status={self.status}>"
+
+
+class RuleSet:
+    def __init__(self, rules):
+        """
+        A list of Rules, in which all the rules with the same target
+        share a single copy of it
+        """
+
+        self.rules = list(rules)
+        targets = {}
+
+        for rule in self.rules:
+            if rule.target is not None:
+                rule.value = targets.setdefault(rule.target, rule.target)
+
+    def __len__(self):
+        return len(self.rules)
+
+    def __iter__(self):
+        return iter(self.rules)
+
+    def __getitem__(self, index):
+        return self.rules[index]
+
+
+def prefork():
+    """
+    Move every object created so far, including the loaded rules and
+    their matchers, out of reach of the cyclic garbage collector.
+
+    Call this in the master process once the app has been loaded,
+    just before the workers are forked, e.g. in gunicorn's "when_ready"
+    hook with "preload_app = True". The collector writes to every
+    object it examines, so without this, each worker's first full
+    collection copies all the pages holding the rules.
+
+    This only stops the collector's writes. Matching a path still
+    updates the reference counts of the rules and patterns it tries,
+    so each worker gets its own copy of the pages holding every rule
+    its requests have scanned. Literal paths and small segments touch
+    a few rules per request, but a path missing every RegEx in a
+    segment of thousands copies most of that segment. For such
+    segments, engine="combined" scans a few merged patterns instead
+    of each rule (see benchmarks/memory.py).
+
+    Maps reloaded later in a worker (see FileReloader) belong to that
+    worker alone. Maps loaded with lazy=True should be warmed up
+    (see ResponsesMap.warm_up) first, or each worker compiles its
+    own copy of every pattern it uses.
+    """
+
+    gc.collect()
+    gc.freeze()
+
+
+def is_literal(pattern):
+    """
+    Whether a RegEx source contains no special characters at all,
+    so it only ever matches the exact same string
+    """
+
+    return _LITERAL.fullmatch(pattern) is not None
+
+
+def _tokens(pattern):
+    """
+    Split a RegEx source into escape sequences, character sets
+    and single characters, yielding each with its position
+    """
+
+    index = 0
+    length = len(pattern)
+
+    while index < length:
+        end = index + 1
+
+        if pattern[index] == "\\":
+            end += 1
+        elif pattern[index] == "[":
+            if pattern.startswith("^", end):
+                end += 1
+            if pattern.startswith("]", end):
+                end += 1
+
+            while end < length and pattern[end] != "]":
+                end += 2 if pattern[end] == "\\" else 1
+
+            end += 1
+
+        yield index, pattern[index:end]
+        index = end
+
+
+def _strip_group_names(pattern):
+    """
+    Return a copy of a RegEx source with "(?P<name>...)" groups
+    turned into plain "(...)" groups, so it can share one compiled
+    pattern with others using the same group names.
+
+    Returns None for patterns which can't be merged with others:
+    back-references, conditionals and global inline flags all
+    depend on the position of the pattern within the whole RegEx.
+    """
+
+    output = []
+    skip_to = 0
+
+    for index, token in _tokens(pattern):
+        if index < skip_to:
+            continue
+
+        if token[0] == "\\" and token[1:].isdigit() and token[1:] != "0":
+            return None
+
+        if token == "(":
+            if pattern.startswith("(?P<", index):
+                skip_to = pattern.find(">", index) + 1
+            elif pattern.startswith(("(?P=", "(?("), index):
+                return None
+            elif _GLOBAL_FLAGS.match(pattern, index):
+                return None
+
+        output.append(token)
+
+    return "".join(output)
+
+
+def first_segment(pattern):
+    """
+    Return the first path segment which every match of a RegEx
+    source must start with, when the source begins with one, e.g.:
+
+        /docs/(?P<page>.*) -> "docs"
+        /blog/?            -> "blog"
+        /(docs|blog)/.*    -> None
+
+    Patterns with alternations outside of any group, comments
+    or global flags may not match their first segment literally,
+    so they have no segment either.
+    """
+
+    prefix = _PREFIX.match(pattern)
+
+    if not prefix or "(?#" in pattern or _GLOBAL_FLAGS.search(pattern):
+        return None
+
+    if has_alternation(pattern):
+        return None
+
+    return prefix.group(1)
+
+
+def has_alternation(pattern):
+    """
+    Whether a RegEx source has a "|" outside of any group,
+    so "/" + pattern would only add "/" to its first alternative
+    """
+
+    if "|" not in pattern:
+        return False
+
+    depth = 0
+
+    for index, token in _tokens(pattern):
+        if token == "(":
+            depth += 1
+        elif token == ")":
+            depth -= 1
+        elif token == "|" and depth == 0:
+            return True
+
+    return False
+
+
+def backtracking_risk(pattern):
+    """
+    Return the part of a RegEx source which could make matching take
+    exponential time on some paths, or None. Two shapes are flagged,
+    which between them cover the usual mistakes:
+
+        (a+)+         -> a repeated group with a repeat inside it
+        (a|ab)*       -> a repeated group with alternatives which
+                         can start with the same text
+        (docs|blog)/.* -> None
+
+    A repeated group which starts or ends with a literal character
+    that nothing else inside it can match, like "(/[\\w-]+)*" or
+    "([^/]+/)*", is safe, as each repetition can only start, or end,
+    at one of those characters.
+
+    Other patterns can still be slow, polynomially, on long paths
+    (see the max_path_length option of ResponsesMap).
+    """
+
+    if not _REPEATED_GROUP.search(pattern):
+        return None
+
+    # For each open group: its start, whether anything inside it is
+    # repeated, the first token of each of its alternatives, all the
+    # tokens inside it which match characters, and its last token,
+    # or None if that may not be where the group ends
+    groups = []
+    branch_start = False
+    skip_to = 0
+
+    for index, token in _tokens(pattern):
+        if index < skip_to:
+            continue
+
+        if token == "(":
+            if pattern.startswith("(?#", index):
+                skip_to = pattern.find(")", index) + 1
+                continue
+
+            if branch_start and groups:
+                groups[-1][2].append(None)
+
+            prefix = _GROUP_PREFIX.match(pattern, index)
+            skip_to = prefix.end()
+            groups.append([index, False, [], [], None])
+            branch_start = True
+            continue
+
+        repeat = _REPEAT.match(pattern, index + len(token))
+        # A token which is optional or repeated may not be where
+        # an alternative starts or ends
+        optional = repeat or pattern.startswith("?", index + len(token))
+
+        if branch_start and groups:
+            groups[-1][2].append(None if token == "." or optional else token)
+
+        branch_start = token == "|"
+
+        if token == ")" and groups:
+            start, repeated, firsts, atoms, last = groups.pop()
+            end = repeat.end() if repeat else None
+
+            if groups:
+                groups[-1][3].extend(atoms)
+                groups[-1][4] = None
+
+            if repeat and repeated and not _delimited(firsts, atoms, last):
+                return pattern[start:end]
+
+            if repeat and len(firsts) > 1:
+                if None in firsts or len(set(firsts)) < len(firsts):
+                    return pattern[start:end]
+
+            token_repeated = repeated or repeat is not None
+        else:
+            token_repeated = repeat is not None and token not in "*+?{}|"
+
+            if groups and token not in "*+?{}|^$":
+                groups[-1][3].append(token)
+                groups[-1][4] = None if token == "." or optional else token
+            elif groups and token not in "*+?{}":
+                groups[-1][4] = None
+
+        if token_repeated and groups:
+            groups[-1][1] = True
+
+    return None
+
+
+def _delimited(firsts, atoms, last):
+    """
+    Whether a group with the given first tokens for its alternatives,
+    tokens inside it, and last token, has a single alternative starting
+    or ending with a literal character which none of its other tokens
+    can match
+    """
+
+    if len(firsts) != 1 or not atoms:
+        return False
+
+    if firsts[0] == atoms[0] and _delimits(firsts[0], atoms[1:]):
+        return True
+
+    return last == atoms[-1] and _delimits(last, atoms[:-1])
+
+
+def _delimits(delimiter, atoms):
+    """
+    Whether a token is a literal character which none of the
+    other atoms can match
+    """
+
+    if delimiter is None:
+        return False
+
+    if delimiter[0] == "\\":
+        delimiter = delimiter[1:]
+
+        if delimiter.isalnum():
+            return False
+    elif len(delimiter) != 1 or delimiter in "[].*+?{}|()^$":
+        return False
+
+    for token in atoms:
+        try:
+            if re.fullmatch(token, delimiter):
+                return False
+        except re.error:
+            return False
+
+    return True
+
+
+def root_pattern(pattern):
+    """
+    Return a RegEx source which matches the same paths as a pattern
+    written for paths without their leading "/", but with it:
+
+        hello   -> /hello
+        a|b     -> /(?:a|b)
+        (?i)abc -> (?i)/abc
+    """
+
+    flags = _GLOBAL_FLAGS.match(pattern)
+    start = flags.end() if flags else 0
+    flags, pattern = pattern[:start], pattern[start:]
+
+    if has_alternation(pattern):
+        pattern = f"(?:{pattern})"
+
+    return f"{flags}/{pattern}"
+
+
+def normalize_pattern(url_path):
+    """
+    Return the RegEx source matching request paths, which always
+    start with "/", for a path from a rule file, which may not
+    (see root_pattern)
+    """
+
+    if url_path[:1] == "/":
+        return url_path
+
+    return root_pattern(url_path)
+
+
+class InvalidRulesError(re.error):
+    """
+    One or more rules in rule files whose paths aren't valid RegEx
+    patterns, or, for redirects, whose targets aren't strings, with a
+    (filepath, line, path, message) tuple for each of them in the
+    errors attribute
+    """
+
+    def __init__(self, errors):
+        self.errors = errors
+
+        super().__init__(
+            f"{len(errors)} invalid rules:\n"
+            + "\n".join(
+                f"{filepath}:{line}: {url_path}: {message}"
+                for filepath, line, url_path, message in errors
+            )
+        )
+
+
+def read_rules(filepath, status, cache_dir=None, lazy=False):
+    """
+    Yield a (Rule, line) pair for each path in a YAML file of rules,
+    with the status, and the value as the target of redirects, or as
+    the context of deleted paths, which have a status of 410
+
+    Paths which aren't valid patterns, and redirects whose target isn't
+    a string, e.g. when a file of deleted paths is read as redirects,
+    are skipped, then reported all together, with their line numbers,
+    in an InvalidRulesError
+
+    With lazy, each pattern is a LazyPattern, which isn't compiled,
+    or checked, until it's first needed
+    """
+
+    errors = []
+
+    for url_path, value, line in load_rules(filepath, cache_dir):
+        if status != 410 and not isinstance(value, str):
+            message = (
+                f"redirect target must be a string, not {type(value).__name__}"
+            )
+            errors.append((filepath, line, url_path, message))
+            continue
+
+        if lazy:
+            pattern = LazyPattern(normalize_pattern(url_path))
+        else:
+            try:
+                pattern = re.compile(normalize_pattern(url_path))
+            except re.error as error:
+                errors.append((filepath, line, url_path, str(error)))
+                continue
+
+        if status == 410:
+            yield Rule(pattern, status=status, context=value), line
+        else:
+            yield Rule(pattern, value, status), line
+
+    if errors:
+        raise InvalidRulesError(errors)
+
+
+def _pattern_errors(rules, backtracking=False):
+    """
+    Return a (filepath, line, path, message) tuple for each of the
+    (filepath, line, path) rules whose path isn't a valid pattern,
+    or, with backtracking, could backtrack catastrophically
+    """
+
+    errors = []
+
+    for filepath, line, url_path in rules:
+        pattern = normalize_pattern(url_path)
+
+        try:
+            re.compile(pattern)
+        except re.error as error:
+            errors.append((filepath, line, url_path, str(error)))
+            continue
+
+        risk = backtracking and backtracking_risk(pattern)
+
+        if risk:
+            message = f"may backtrack catastrophically at {risk}"
+            errors.append((filepath, line, url_path, message))
+
+    return errors
+
+
+def validate_rules(path, processes=None, shard_size=5000, backtracking=False):
+    """
+    Return a (filepath, line, path, message) tuple for every path which
+    isn't a valid pattern, in all the rule files for a path, directory,
+    glob or list of them (see rule_file_paths), in order. With
+    backtracking, paths which could take exponential time to match
+    (see backtracking_risk) are returned too.
+
+    The rules are split into shards of shard_size, which are compiled
+    in a pool of processes (all the CPUs by default), so checking large
+    files, e.g. in CI, takes a fraction of the time. With processes=1,
+    everything is compiled in this process.
+    """
+
+    rules = [
+        (filepath, line, url_path)
+        for filepath in rule_file_paths(path)
+        for url_path, value, line in load_rules(filepath)
+    ]
+    shards = [
+        rules[start:end]
+        for start, end in zip(
+            range(0, len(rules), shard_size),
+            range(shard_size, len(rules) + shard_size, shard_size),
+        )
+    ]
+
+    if processes == 1 or len(shards) < 2:
+        return _pattern_errors(rules, backtracking)
+
+    with ProcessPoolExecutor(processes) as executor:
+        return [
+            error
+            for errors in executor.map(
+                _pattern_errors, shards, [backtracking] * len(shards)
+            )
+            for error in errors
+        ]
+
+
+def _path_segment(url_path):
+    return url_path.split("/", 2)[1] if url_path[:1] == "/" else None
+
+
+class SequentialMatcher:
+    def __init__(self, rules):
+        """
+        Given a list of Rules, find the first match for a path
+        by trying each rule's regex in turn
+        """
+
+        self.rules = rules
+
+    def first_match(self, url_path, stop=None):
+        """
+        Return the (index, rule, groupdict) of the first match
+        for url_path, or None.
+
+        Only the rules before the stop index are tried.
+        """
+
+        for index, rule in enumerate(islice(self.rules, stop)):
+            result = rule.pattern.fullmatch(url_path)
+
+            if result:
+                return index, rule, result.groupdict()
+
+
+class CombinedMatcher:
+    def __init__(self, rules, chunk_size=500):
+        """
+        Given a list of Rules, merge their consecutive patterns into
+        alternations of up to chunk_size patterns, each wrapped in a
+        numbered sentinel group:
+
+            (<regex 1>)|(<regex 2>)|...
+
+        so the first matching pattern is found with a single
+        fullmatch call per chunk. Named groups are stripped from
+        the merged source and read back by their offset from the
+        sentinel group.
+
+        Patterns which can't be merged (see _strip_group_names) are
+        kept as their own chunk, in place, so the order of the
+        rules is always preserved.
+        """
+
+        self.rules = rules
+        self.chunks = []
+
+        pending = []
+
+        for index, rule in enumerate(rules):
+            match = rule.pattern
+            source = _strip_group_names(match.pattern)
+
+            if source is None or match.flags & ~re.UNICODE:
+                self._add_chunk(pending)
+                self.chunks.append((index, match, None, (index, rule)))
+                pending = []
+                continue
+
+            pending.append((index, match, rule, source))
+
+            if len(pending) >= chunk_size:
+                self._add_chunk(pending)
+                pending = []
+
+        self._add_chunk(pending)
+
+    def _add_chunk(self, pending):
+        if not pending:
+            return
+
+        sources = []
+        lookup = {}
+        group = 1
+
+        for index, match, rule, source in pending:
+            sources.append(f"({source})")
+            names = {
+                name: group + offset
+                for name, offset in match.groupindex.items()
+            }
+            lookup[group] = (index, rule, names)
+            group += match.groups + 1
+
+        try:
+            combined = re.compile("|".join(sources))
+        except re.error:
+            combined = None
+
+        if combined is None or combined.groups != group - 1:
+            # Fall back to matching each pattern on its own
+            for index, match, rule, source in pending:
+                self.chunks.append((index, match, None, (index, rule)))
+        else:
+            self.chunks.append((pending[0][0], combined, lookup, None))
+
+    def first_match(self, url_path, stop=None):
+        """
+        Return the (index, rule, groupdict) of the first match
+        for url_path, or None.
+
+        Only the rules before the stop index are tried.
+        """
+
+        for start, combined, lookup, single in self.chunks:
+            if stop is not None and start >= stop:
+                return None
+
+            result = combined.fullmatch(url_path)
+
+            if result:
+                if lookup is None:
+                    index, rule = single
+                    groups = result.groupdict()
+                else:
+                    index, rule, names = lookup[result.lastindex]
+                    groups = {
+                        name: result.group(group)
+                        for name, group in names.items()
+                    }
+
+                if stop is not None and index >= stop:
+                    return None
+
+                return index, rule, groups
+
+
+ENGINES = {"sequential": SequentialMatcher, "combined": CombinedMatcher}
+
+
+class _IndexedEngine:
+    def __init__(self, rules, indexes, engine, lazy=False):
+        """
+        A RegEx engine for some of the rules of an IndexedMatcher,
+        along with the index of each of them in the whole list.
+
+        With lazy, the engine is only built for the first path
+        it's asked to match.
+        """
+
+        self.rules = rules
+        self.indexes = indexes
+        self.engine_class = ENGINES[engine]
+        self.engine = None if lazy else self.engine_class(rules)
+
+    def build(self):
+        """
+        Return the engine, building it if it hasn't been
+        """
+
+        if self.engine is None:
+            with _COMPILE_LOCK:
+                if self.engine is None:
+                    self.engine = self.engine_class(self.rules)
+
+        return self.engine
+
+    def warm_up(self):
+        self.build()
+
+        for rule in self.rules:
+            if isinstance(rule.pattern, LazyPattern):
+                rule.pattern.compile()
+
+    def first_match(self, url_path, before=None):
+        """
+        Return the (index, rule, groupdict) of the first match
+        for url_path with an index lower than before, or None
+        """
+
+        stop = None
+
+        if before is not None:
+            stop = bisect_left(self.indexes, before)
+
+            if not stop:
+                return None
+
+        engine = self.engine or self.build()
+        first_match = engine.first_match(url_path, stop=stop)
+
+        if first_match:
+            position, rule, groups = first_match
+
+            return self.indexes[position], rule, groups
+
+
+class IndexedMatcher:
+    def __init__(self, rules, engine="sequential", cache_size=0, lazy=False):
+        """
+        Given a list of Rules, put the patterns without any special
+        characters (see is_literal) into a dictionary, so they are found
+        with a single lookup.
+
+        Then group the other patterns by the first path segment they
+        match (see first_segment), so a path is only matched against
+        the patterns for its own first segment, and the patterns
+        without one. Each group has its own RegEx engine.
+
+        Every rule keeps its index in the list, and a path takes the
+        match with the lowest index of all of these, so an earlier
+        RegEx which matches the same path as a literal still wins.
+
+        With a cache_size, the result for each path, including
+        no match at all, is kept in an LRU cache of that many paths.
+
+        With lazy, each group's engine is only built, and, for rules
+        with a LazyPattern, each pattern only compiled, when a path
+        first needs it, unless warm_up is called first.
+        """
+
+        self.rules = rules
+        self.literals = {}
+
+        segments = {}
+
+        for index, rule in enumerate(rules):
+            match = rule.pattern
+
+            if is_literal(match.pattern) and not match.flags & ~re.UNICODE:
+                self.literals.setdefault(match.pattern, (index, rule, {}))
+            else:
+                segment = first_segment(match.pattern)
+                segments.setdefault(segment, []).append(index)
+
+        self.segments = {
+            segment: _IndexedEngine(
+                [rules[index] for index in indexes], indexes, engine, lazy
+            )
+            for segment, indexes in segments.items()
+        }
+        self.unsegmented = self.segments.pop(None, None)
+
+        if cache_size:
+            self.first_match = lru_cache(maxsize=cache_size)(self.first_match)
+
+    def warm_up(self):
+        """
+        Build every engine and compile every pattern they use now,
+        rather than when a path first needs them
+        """
+
+        for engine in self.segments.values():
+            engine.warm_up()
+
+        if self.unsegmented:
+            self.unsegmented.warm_up()
+
+    def cache_info(self):
+        """
+        Return the hits, misses and size of the LRU cache,
+        or None when there's no cache
+        """
+
+        if hasattr(self.first_match, "cache_info"):
+            return self.first_match.cache_info()
+
+    def cache_clear(self):
+        if hasattr(self.first_match, "cache_clear"):
+            self.first_match.cache_clear()
+
+    def first_match(self, url_path):
+        """
+        Return the (index, rule, groupdict) of the first match
+        for url_path, or None
+        """
+
+        best = self.literals.get(url_path)
+        engines = [
+            self.segments.get(_path_segment(url_path)),
+            self.unsegmented,
+        ]
+
+        for engine in engines:
+            if engine:
+                first_match = engine.first_match(
+                    url_path, before=best[0] if best else None
+                )
+
+                if first_match:
+                    best = first_match
+
+        return best
+
+
+def _merge_query(target_url, query_string):
+    """
+    Add the query string to a URL, after any query it already has
+    """
+
+    parsed_target_url = urlparse(target_url)
+    target_query = parsed_target_url.query
+
+    if target_query:
+        return parsed_target_url._replace(
+            query=f"{target_query}&{query_string}"
+        ).geturl()
+
+    return parsed_target_url._replace(query=query_string).geturl()
+
+
+def quote_location(target_url):
+    """
+    Percent-encode any characters of a target URL which can't be sent
+    in a Location header, for servers which take raw latin-1 headers:
+    non-ASCII characters, spaces, and control characters such as CR
+    and LF, which groups can capture from the decoded request path
+    and which would otherwise split the response
+    """
+
+    if not _LOCATION_UNSAFE.search(target_url):
+        return target_url
+
+    return quote(target_url, safe=_LOCATION_SAFE)
+
+
+class TargetTemplate:
+    def __init__(self, target):
+        """
+        Parse a redirect target, e.g. "/docs/{page}?from=old", into
+        its literal text and the names of its placeholders once, so
+        rendering it is a single join.
+
+        The query of the target is kept apart from the rest, so the
+        query string of a request can be added without parsing the
+        rendered URL again. Targets whose rendered URL would be
+        changed by parsing it, e.g. with a fragment, an upper case
+        scheme or path parameters, are still rendered with format
+        and urlparse, as are targets with positional or formatted
+        placeholders.
+        """
+
+        self.target = target
+        self.pieces = None
+
+        try:
+            fields = list(Formatter().parse(target))
+        except (TypeError, ValueError):
+            return
+
+        # Literal text is at the even indexes, and names at the odd ones
+        pieces = [""]
+
+        for literal, name, format_spec, conversion in fields:
+            pieces[-1] += literal
+
+            if name is not None:
+                if not name.isidentifier() or format_spec or conversion:
+                    return
+
+                pieces += [name, ""]
+
+        self.pieces = pieces
+        self.names = [
+            (index, pieces[index]) for index in range(1, len(pieces), 2)
+        ]
+        self.query_index = None
+
+        for index in range(0, len(pieces), 2):
+            if "?" in pieces[index]:
+                self.query_index = index
+                break
+
+        literal_text = "".join(pieces[::2])
+        path, _, query = literal_text.partition("?")
+        self.mergeable = (
+            _URL_START.match(target) is not None
+            and not _URL_UNSAFE.search(path)
+            and not _URL_UNSAFE.search(query.replace("?", "").replace(";", ""))
+        )
+
+    def render(self, groups, query_string=""):
+        """
+        Fill in the placeholders with the RegEx groups, taking groups
+        which didn't match as empty strings, and add the query_string
+        """
+
+        if self.pieces is None:
+            return self._render_parsed(groups, query_string)
+
+        parts = self.pieces[:]
+
+        for index, name in self.names:
+            parts[index] = groups[name] or ""
+
+        if not query_string:
+            return "".join(parts)
+
+        if not self.mergeable or any(
+            _URL_UNSAFE.search(parts[index]) for index, name in self.names
+        ):
+            return _merge_query("".join(parts), query_string)
+
+        if self.query_index is None:
+            return "".join(parts) + "?" + query_string
+
+        path, query = parts[self.query_index].split("?", 1)
+        before = "".join(islice(parts, self.query_index)) + path
+        target_query = query + "".join(
+            islice(parts, self.query_index + 1, None)
+        )
+
+        if target_query:
+            return f"{before}?{target_query}&{query_string}"
+
+        return f"{before}?{query_string}"
+
+    def _render_parsed(self, groups, query_string):
+        parts = {}
+        for name, value in groups.items():
+            parts[name] = value or ""
+
+        target_url = self.target.format(**parts)
+
+        if query_string:
+            target_url = _merge_query(target_url, query_string)
+
+        return target_url
+
+
+class ResponsesMap:
+    def __init__(
+        self,
+        sources,
+        engine="sequential",
+        cache_size=0,
+        cache_dir=None,
+        instrument=None,
+        max_path_length=None,
+        lazy=False,
+    ):
+        """
+        Given a list of YAML files of rules, each with the status of
+        the responses for its paths:
+
+            [("redirects.yaml", 302), ("deleted.yaml", 410)]
+
+        Each path can also be a directory, a glob or a list of paths,
+        for several files with the same status (see rule_file_paths).
+        A path which appears in more than one file is logged, as only
+        the first of them can ever match. Paths which aren't valid
+        patterns, from every file, are raised together in an
+        InvalidRulesError. Patterns which could take exponential time
+        to match some paths (see backtracking_risk) are logged.
+
+        Read the rules from every file, in order, into a RuleSet, parse
+        each distinct redirect target into a TargetTemplate, and put
+        all the rules into a single IndexedMatcher, with the engine and
+        cache_size options. A path gets the response for the first rule
+        it matches, so earlier files win. Where each rule came from is
+        kept once per file, with an array of line numbers, rather than
+        on every rule (see location).
+
+        With an instrument, such as a MatchStats, every lookup is timed
+        and reported to it as instrument(rule, seconds, location), where
+        location is the (filepath, line) of the rule, and both are None
+        when nothing matched. Without one, lookups aren't wrapped
+        at all.
+
+        With a max_path_length, longer paths are never matched, so the
+        time a crafted path can spend in any one pattern is bounded.
+        Python's re has no timeout, so this is the only guard for a
+        pattern which backtracks badly. Limit it to well above the
+        longest path any rule needs to match.
+
+        With lazy, no pattern is compiled while loading: each one is
+        compiled the first time a path is matched against it (see
+        LazyPattern), so startup takes little more than reading the
+        files, and patterns for paths which are never requested, or
+        which are always found in the literal index, are never
+        compiled at all. Invalid patterns are then only logged when
+        they're first needed, so check the files with validate_rules,
+        e.g. in CI. Call warm_up to compile everything up front.
+
+        This holds everything about matching requests which doesn't
+        depend on a web framework, for the Flask and Django helpers.
+        """
+
+        rules = []
+        self.starts = []
+        self.file_starts = []
+        self.filepaths = []
+        self.lines = array("I")
+        locations = {}
+        errors = []
+
+        for filepath, status in sources:
+            if status != 410 and status not in REDIRECT_STATUSES:
+                raise ValueError(f"Unsupported status {status} for {filepath}")
+
+            self.starts.append(len(rules))
+
+            for path in rule_file_paths(filepath):
+                self.file_starts.append(len(rules))
+                self.filepaths.append(path)
+
+                try:
+                    for rule, line in read_rules(
+                        path, status, cache_dir, lazy
+                    ):
+                        location = f"{path}:{line}"
+                        first = locations.setdefault(
+                            rule.pattern.pattern, location
+                        )
+
+                        if first is not location:
+                            logger.warning(
+                                "%s repeats the path %s from %s, "
+                                "which takes precedence",
+                                location,
+                                rule.pattern.pattern,
+                                first,
+                            )
+
+                        if not is_literal(rule.pattern.pattern):
+                            risk = backtracking_risk(rule.pattern.pattern)
+
+                            if risk:
+                                logger.warning(
+                                    "%s: %s may backtrack catastrophically"
+                                    " at %s",
+                                    location,
+                                    rule.pattern.pattern,
+                                    risk,
+                                )
+
+                        rules.append(rule)
+                        self.lines.append(line)
+                except InvalidRulesError as error:
+                    errors.extend(error.errors)
+
+        if errors:
+            raise InvalidRulesError(errors)
+
+        self.rules = RuleSet(rules)
+        self.templates = {
+            rule.target: TargetTemplate(rule.target)
+            for rule in self.rules
+            if rule.status != 410
+        }
+        self.matcher = IndexedMatcher(
+            self.rules, engine=engine, cache_size=cache_size, lazy=lazy
+        )
+        self.instrument = instrument
+        self.max_path_length = max_path_length
+        self._first_match = self.matcher.first_match
+
+        if max_path_length is not None:
+            self._first_match = self.first_match = self._limited_first_match
+
+        if instrument is not None:
+            self.first_match = self._instrumented_first_match
+
+    def first_match(self, url_path):
+        """
+        Return the (index, rule, groupdict) of the first rule
+        matching url_path, or None
+        """
+
+        return self.matcher.first_match(url_path)
+
+    def warm_up(self):
+        """
+        Compile every pattern now, for maps loaded with lazy=True,
+        e.g. in a server's master process before forking workers,
+        so the workers share the compiled patterns (see prefork)
+        """
+
+        self.matcher.warm_up()
+
+    def _limited_first_match(self, url_path):
+        if len(url_path) > self.max_path_length:
+            return None
+
+        return self.matcher.first_match(url_path)
+
+    def _instrumented_first_match(self, url_path):
+        started = time.perf_counter()
+        first_match = self._first_match(url_path)
+        seconds = time.perf_counter() - started
+
+        if first_match:
+            index, rule, groups = first_match
+            self.instrument(rule, seconds, self.location(index))
+        else:
+            self.instrument(None, seconds, None)
+
+        return first_match
+
+    def source_index(self, index):
+        """
+        The position in the sources of the file a rule came from
+        """
+
+        return bisect_right(self.starts, index) - 1
+
+    def location(self, index):
+        """
+        The (filepath, line) where a rule appears
+        """
+
+        filepath = self.filepaths[bisect_right(self.file_starts, index) - 1]
+
+        return filepath, self.lines[index]
+
+    def target_url(self, rule, groups, query_string=""):
+        """
+        The URL to redirect to for a redirect rule which matched with
+        the groups, with the request's query string added
+        """
+
+        return self.templates[rule.value].render(groups, query_string)
+
+
+class MatchStats:
+    """
+    An instrument for ResponsesMaps, counting the hits for each rule,
+    by the file and line it's on, and the paths which matched nothing,
+    with a histogram of how long each lookup took.
+
+    The same MatchStats can be shared by several maps, and keeps its
+    counts when a map is reloaded. samples() returns everything in the
+    shape of Prometheus metrics.
+    """
+
+    # Upper bounds of the histogram buckets, in seconds
+    BUCKETS = (
+        0.000001,
+        0.0000025,
+        0.000005,
+        0.00001,
+        0.000025,
+        0.00005,
+        0.0001,
+        0.00025,
+        0.0005,
+        0.001,
+        0.0025,
+        0.01,
+        float("inf"),
+    )
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self.hits = {}
+        self.misses = 0
+        self.bucket_counts = [0] * len(self.buckets)
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def __call__(self, rule, seconds, location):
+        bucket = bisect_left(self.buckets, seconds)
+
+        with self._lock:
+            if rule is None:
+                self.misses += 1
+            else:
+                self.hits[location] = self.hits.get(location, 0) + 1
+
+            self.bucket_counts[bucket] += 1
+            self.seconds += seconds
+
+    def samples(self, prefix="yaml_responses"):
+        """
+        Return a (name, labels, value) tuple for each of the counts:
+
+            ("yaml_responses_rule_hits_total",
+             {"file": "redirects.yaml", "line": "3"}, 12)
+            ("yaml_responses_misses_total", {}, 40)
+            ("yaml_responses_match_seconds_bucket", {"le": "1e-06"}, 3)
+            ...
+            ("yaml_responses_match_seconds_count", {}, 52)
+            ("yaml_responses_match_seconds_sum", {}, 0.0001)
+
+        where the histogram buckets are cumulative
+        """
+
+        with self._lock:
+            hits = sorted(self.hits.items(), key=str)
+            misses = self.misses
+            bucket_counts = list(self.bucket_counts)
+            seconds = self.seconds
+
+        samples = [
+            (
+                f"{prefix}_rule_hits_total",
+                {"file": str(filepath), "line": str(line)},
+                count,
+            )
+            for (filepath, line), count in hits
+        ]
+        samples.append((f"{prefix}_misses_total", {}, misses))
+
+        total = 0
+
+        for bucket, count in zip(self.buckets, bucket_counts):
+            total += count
+            le = "+Inf" if bucket == float("inf") else repr(bucket)
+            samples.append(
+                (f"{prefix}_match_seconds_bucket", {"le": le}, total)
+            )
+
+        samples.append((f"{prefix}_match_seconds_count", {}, total))
+        samples.append((f"{prefix}_match_seconds_sum", {}, seconds))
+
+        return samples
+
+
+def map_getter(build, path, reload_interval=None):
+    """
+    Return a function returning the map built by build(), which is
+    rebuilt when any of the rule files for the path, directory, glob
+    or list of them change, if there is a reload_interval
+    (see FileReloader)
+    """
+
+    if reload_interval is None:
+        built = build()
+
+        return lambda: built
+
+    return FileReloader(path, lambda path: build(), reload_interval).get
+
+
+def responses_map_getter(sources, reload_interval=None, **options):
+    """
+    Return a function returning a ResponsesMap for the sources, which
+    is reloaded when any of the files change if there is a
+    reload_interval (see map_getter)
+    """
+
+    return map_getter(
+        lambda: ResponsesMap(sources, **options),
+        [filepath for filepath, status in sources],
+        reload_interval,
+    )
+
+
+def _file_signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+class FileReloader:
+    def __init__(self, path, build, interval=10):
+        """
+        Keep the object built by build(path) up to date with the file.
+        The path can also be a directory, a glob or a list of paths,
+        to rebuild the object when any of the files change, or when
+        files are added or removed (see watched_paths).
+
+        Every interval seconds at most, get() checks the modification
+        time, inode and size of each file. When they have changed, a
+        new object is built in a background thread, and swapped in
+        once it's complete, so get() always returns a fully built
+        object. The files to check are found again each time, so
+        files added since the last reload are checked too.
+
+        If building the new object fails, the error is logged and the
+        previous object is kept.
+        """
+
+        self.path = path
+        self.build = build
+        self.interval = interval
+        self.thread = None
+
+        self._lock = threading.Lock()
+        self._reloading = False
+        self._signature = self._stat()
+        self._next_check = time.monotonic() + interval
+        self.current = build(path)
+
+    def _stat(self):
+        return [
+            (path, _file_signature(path)) for path in watched_paths(self.path)
+        ]
+
+    def get(self):
+        if time.monotonic() >= self._next_check:
+            self.check()
+
+        return self.current
+
+    def check(self):
+        """
+        Start a reload if the file has changed since the last one
+        """
+
+        with self._lock:
+            if self._reloading or time.monotonic() < self._next_check:
+                return
+
+            self._next_check = time.monotonic() + self.interval
+            signature = self._stat()
+
+            if signature == self._signature:
+                return
+
+            self._reloading = True
+
+        self.start_reload(signature)
+
+    def start_reload(self, signature):
+        self.thread = threading.Thread(
+            target=self.reload, args=(signature,), daemon=True
+        )
+        self.thread.start()
+
+    def reload(self, signature):
+        """
+        Build a new object from the file, which had the given signature
+        before building started, and swap it in
+        """
+
+        try:
+            current = self.build(self.path)
+        except Exception:
+            logger.exception(
+                "Failed to reload %s, keeping the previous version", self.path
+            )
+        else:
+            self.current = current
+        finally:
+            self._signature = signature
+            self._reloading = False
@@ -1,11 +1,27 @@
 # Core packages
-import os
+import re
+from functools import lru_cache
 
 # Third party packages
-import yaml
+from django.conf import settings as django_settings
+from django.http import HttpResponsePermanentRedirect, HttpResponseRedirect
 from django.shortcuts import redirect, render
 from django.conf.urls import url
-from yamlloader import ordereddict
+from django.urls import ResolverMatch, URLPattern
+from django.urls.resolvers import RegexPattern
+from django.utils.module_loading import import_string
+
+# Local
+from canonicalwebteam.yaml_responses.core import (
+    ResponsesMap,
+    TargetTemplate,
+    is_literal,
+    load_rules,
+    responses_map_getter,
+)
+
+# The parsed targets of the redirects served by create_redirect_views
+_target_template = lru_cache(maxsize=4096)(TargetTemplate)
 
 
 def _create_view(view_callback, url_mapping, settings={}):
@@ -20,7 +36,116 @@ def _create_view(view_callback, url_mapping, settings={}):
     return url_view
 
 
-def _create_views_from_yaml(yaml_filepath, view_callback, settings={}):
+class _LiteralPathsPattern(URLPattern):
+    """
+    A URL pattern for a run of literal paths, each with its own view,
+    which resolves a path with a single dictionary lookup
+    """
+
+    def __init__(self, views):
+        self.views = views
+
+        super().__init__(
+            RegexPattern(
+                r"^(?:{0})$".format("|".join(map(re.escape, views))),
+                is_endpoint=True,
+            ),
+            next(iter(views.values())),
+        )
+
+    def resolve(self, path):
+        view = self.views.get(path)
+
+        if view:
+            return ResolverMatch(view, (), {}, route=path)
+
+
+def _view_arguments(rule, url_path, groups):
+    """
+    Return the args and kwargs for a view from the groups matched by
+    a rule, as Django does for a RegEx URL pattern: the named groups
+    which matched, or all the groups if none of them are named
+    """
+
+    if groups:
+        kwargs = {
+            name: value for name, value in groups.items() if value is not None
+        }
+
+        return (), kwargs
+
+    return rule.pattern.fullmatch(url_path).groups(), {}
+
+
+def _url_mapping(rule):
+    """
+    The value of a rule in its YAML file, passed to views as url_mapping
+    """
+
+    if rule.status == 410:
+        return dict(rule.context) or None
+
+    return rule.target
+
+
+class _IndexedRulesPattern(URLPattern):
+    """
+    A single URL pattern for all the paths in a YAML file, which finds
+    the first path matching the request in a core.ResponsesMap,
+    and runs view_callback with its mapped value.
+
+    Deleted paths, with a status of 410, map to a template context,
+    and redirects to a target.
+    """
+
+    def __init__(
+        self,
+        yaml_filepath,
+        view_callback,
+        status,
+        settings={},
+        engine="sequential",
+        cache_size=0,
+        cache_dir=None,
+        instrument=None,
+        max_path_length=None,
+        lazy=False,
+    ):
+        self.view_callback = view_callback
+        self.settings = settings
+        self.responses_map = ResponsesMap(
+            [(yaml_filepath, status)],
+            engine=engine,
+            cache_size=cache_size,
+            cache_dir=cache_dir,
+            instrument=instrument,
+            max_path_length=max_path_length,
+            lazy=lazy,
+        )
+
+        # Paths are only ever matched in resolve, never by this pattern
+        super().__init__(
+            RegexPattern(r"(?!)", is_endpoint=True), view_callback
+        )
+
+    def resolve(self, path):
+        first_match = self.responses_map.first_match("/" + path)
+
+        if not first_match:
+            return None
+
+        index, rule, groups = first_match
+        args, kwargs = _view_arguments(rule, "/" + path, groups)
+        url_view = _create_view(
+            self.view_callback, _url_mapping(rule), self.settings
+        )
+
+        return ResolverMatch(url_view, args, kwargs, route=path)
+
+
+def _create_views_from_yaml(
+    yaml_filepath, view_callback, settings={}, cache_dir=None
+):
     """
     Givan a YAML file mapping URL paths to values, e.g.:
 
@@ -30,34 +155,41 @@ def _create_views_from_yaml(yaml_filepath, view_callback, settings={}):
     Create a Django URL pattern from each value, so that when that path
     is requested, view_callback is run, passing the mapped value.
 
+    Consecutive paths without any RegEx characters share a single
+    pattern, which finds the path with a dictionary lookup.
+
+    With a cache_dir, the parsed file is cached on disk
+    (see core.load_rules).
+
     Returns a list of Django urlpatterns.
     """
 
     urlpatterns = []
+    literal_views = {}
 
-    if os.path.isfile(yaml_filepath):
-        with open(yaml_filepath) as yaml_paths_file:
-            url_paths = yaml.load(
-                yaml_paths_file.read(), Loader=ordereddict.CLoader
-            )
-            if url_paths:
-                for url_path, url_mapping in url_paths.items():
-                    urlpatterns.append(
-                        url(
-                            r"^{0}$".format(url_path),
-                            _create_view(view_callback, url_mapping, settings),
-                        )
-                    )
+    for url_path, url_mapping, line in load_rules(yaml_filepath, cache_dir):
+        view = _create_view(view_callback, url_mapping, settings)
+
+        if is_literal(url_path):
+            literal_views[url_path] = view
+            continue
+
+        if literal_views:
+            urlpatterns.append(_LiteralPathsPattern(literal_views))
+            literal_views = {}
+
+        urlpatterns.append(url(r"^{0}$".format(url_path), view))
+
+    if literal_views:
+        urlpatterns.append(_LiteralPathsPattern(literal_views))
 
     return urlpatterns
 
 
 def _redirect_to_target(request, url_mapping, settings, *args, **kwargs):
-    location = url_mapping.format(**kwargs)
-    query = request.META["QUERY_STRING"]
-
-    if query:
-        location += "?" + query
+    location = _target_template(url_mapping).render(
+        kwargs, request.META["QUERY_STRING"]
+    )
 
     return redirect(location, permanent=settings.get("permanent", False))
 
@@ -66,11 +198,180 @@ def _deleted_callback(request, url_mapping, settings, *args, **kwargs):
     return render(request, "410.html", url_mapping, status=410)
 
 
-def create_redirect_views(path="redirects.yaml", permanent=False):
+def create_redirect_views(
+    path="redirects.yaml", permanent=False, cache_dir=None
+):
     return _create_views_from_yaml(
-        path, _redirect_to_target, settings={"permanent": permanent}
+        path,
+        _redirect_to_target,
+        settings={"permanent": permanent},
+        cache_dir=cache_dir,
     )
 
 
-def create_deleted_views(path="deleted.yaml", view_callback=_deleted_callback):
-    return _create_views_from_yaml(path, view_callback)
+def create_deleted_views(
+    path="deleted.yaml", view_callback=_deleted_callback, cache_dir=None
+):
+    return _create_views_from_yaml(path, view_callback, cache_dir=cache_dir)
+
+
+def create_redirect_pattern(
+    path="redirects.yaml",
+    permanent=False,
+    engine="sequential",
+    cache_size=0,
+    cache_dir=None,
+    instrument=None,
+    max_path_length=None,
+    lazy=False,
+):
+    """
+    Return a single URL pattern for all the redirects in the YAML file,
+    in place of the list from create_redirect_views, which Django would
+    try in turn for every request.
+
+    Paths without any RegEx characters are found with a dictionary
+    lookup, and the rest are grouped by their first path segment
+    (see core.IndexedMatcher). The engine, cache_size, cache_dir,
+    instrument, max_path_length and lazy options work as for the Flask
+    prepare_redirects.
+    """
+
+    return _IndexedRulesPattern(
+        path,
+        _redirect_to_target,
+        301 if permanent else 302,
+        settings={"permanent": permanent},
+        engine=engine,
+        cache_size=cache_size,
+        cache_dir=cache_dir,
+        instrument=instrument,
+        max_path_length=max_path_length,
+        lazy=lazy,
+    )
+
+
+def create_deleted_pattern(
+    path="deleted.yaml",
+    view_callback=_deleted_callback,
+    engine="sequential",
+    cache_size=0,
+    cache_dir=None,
+    instrument=None,
+    max_path_length=None,
+    lazy=False,
+):
+    """
+    Return a single URL pattern for all the deleted paths in the YAML
+    file, in the same way as create_redirect_pattern
+    """
+
+    return _IndexedRulesPattern(
+        path,
+        view_callback,
+        410,
+        engine=engine,
+        cache_size=cache_size,
+        cache_dir=cache_dir,
+        instrument=instrument,
+        max_path_length=max_path_length,
+        lazy=lazy,
+    )
+
+
+class YamlResponsesMiddleware:
+    """
+    Serve redirects and deleted paths before Django resolves the URL,
+    from the YAML files in the YAML_RESPONSES setting, e.g.:
+
+        MIDDLEWARE = [
+            "canonicalwebteam.yaml_responses.django_helpers"
+            ".YamlResponsesMiddleware",
+            ...
+        ]
+
+        YAML_RESPONSES = {
+            "redirects": "redirects.yaml",
+            "permanent_redirects": "permanent-redirects.yaml",
+            "deleted": "deleted.yaml",
+            "deleted_callback": "myapp.views.deleted",
+        }
+
+    Each file is optional, and without the setting, redirects.yaml and
+    deleted.yaml are read. A path gets the response for the first rule
+    it matches, in the order of the files above. The deleted_callback,
+    a function or its import path, is called like the view_callback of
+    create_deleted_views.
+
+    The "engine", "cache_size", "reload_interval", "cache_dir",
+    "instrument", "max_path_length" and "lazy" options work as for the
+    Flask prepare_responses, and the instrument can also be given as an
+    import path.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+        options = dict(
+            getattr(
+                django_settings,
+                "YAML_RESPONSES",
+                {"redirects": "redirects.yaml", "deleted": "deleted.yaml"},
+            )
+        )
+        sources = []
+
+        for name, status in [
+            ("redirects", 302),
+            ("permanent_redirects", 301),
+            ("deleted", 410),
+        ]:
+            path = options.pop(name, None)
+
+            if path:
+                sources.append((path, status))
+
+        self.deleted_callback = (
+            options.pop("deleted_callback", None) or _deleted_callback
+        )
+
+        if isinstance(self.deleted_callback, str):
+            self.deleted_callback = import_string(self.deleted_callback)
+
+        if isinstance(options.get("instrument"), str):
+            options["instrument"] = import_string(options["instrument"])
+
+        self.get_responses_map = responses_map_getter(sources, **options)
+
+    def __call__(self, request):
+        return self.process_request(request) or self.get_response(request)
+
+    def process_request(self, request):
+        """
+        Return the redirect or deleted response for the request's path,
+        or None
+        """
+
+        responses_map = self.get_responses_map()
+        first_match = responses_map.first_match(request.path_info)
+
+        if not first_match:
+            return None
+
+        index, rule, groups = first_match
+
+        if rule.status == 410:
+            args, kwargs = _view_arguments(rule, request.path_info, groups)
+
+            return self.deleted_callback(
+                request, _url_mapping(rule), {}, *args, **kwargs
+            )
+
+        target_url = responses_map.target_url(
+            rule, groups, request.META.get("QUERY_STRING", "")
+        )
+
+        if rule.status == 301:
+            return HttpResponsePermanentRedirect(target_url)
+
+        return HttpResponseRedirect(target_url)
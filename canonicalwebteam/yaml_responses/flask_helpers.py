@@ -1,84 +1,283 @@
-# Standard library
-import os
-import re
-from urllib.parse import urlparse
-
 # Packages
 import flask
-import yaml
-from yamlloader import ordereddict
-
 
-class YamlRegexMap:
-    def __init__(self, filepath):
+# Local
+from canonicalwebteam.yaml_responses.core import ResponsesMap, map_getter
+
+
+class YamlRegexMap(ResponsesMap):
+    def __init__(
+        self,
+        filepath,
+        engine="sequential",
+        cache_size=0,
+        cache_dir=None,
+        status=302,
+        instrument=None,
+        max_path_length=None,
+        lazy=False,
+    ):
         """
         Given the path to a YAML file of RegEx mappings like:
 
             hello/(?P<person>.*)?: "/say-hello?name={person}"
             google/(?P<search>.*)?: "https://google.com/?q={search}"
 
-        Return a list of compiled Regex matches and destination strings:
+        Return a set of Rules, each with a compiled Regex match
+        and a destination string:
 
             [
-                (<regex>, "/say-hello?name={person}"),
-                (<regex>, "https://google.com/?q={search}"),
+                Rule(<regex>, "/say-hello?name={person}", 302),
+                Rule(<regex>, "https://google.com/?q={search}", 302),
             ]
-        """
 
-        self.matches = []
+        The filepath can also be a directory, a glob or a list of paths,
+        to merge the rules from several files, in order, into one map
+        (see core.rule_file_paths).
+
+        Paths without any RegEx characters are found with a dictionary
+        lookup, and the rest are grouped by their first path segment
+        (see core.IndexedMatcher). The engine decides how a path is
+        matched against a group: "sequential" tries each regex in turn,
+        "combined" merges them into a few alternations
+        (see core.CombinedMatcher).
+
+        Each distinct target is parsed once, into a TargetTemplate
+        which renders it, with the request's query string, in a
+        single join.
+
+        With a cache_size, the match for each of the last cache_size
+        paths is remembered, so repeated paths skip RegEx matching.
 
-        if os.path.isfile(filepath):
-            with open(filepath) as redirects_file:
-                lines = yaml.load(redirects_file, Loader=ordereddict.CLoader)
+        With a cache_dir, the parsed file is cached on disk
+        (see core.load_rules).
 
-                if lines:
-                    for url_match, target_url in lines.items():
-                        if url_match[0] != "/":
-                            url_match = "/" + url_match
+        With an instrument, such as a core.MatchStats, each lookup
+        is timed and reported to it (see core.ResponsesMap).
 
-                        self.matches.append(
-                            (re.compile(url_match), target_url)
-                        )
+        With a max_path_length, longer paths are never matched, to
+        bound the time spent in any pattern which backtracks badly.
+
+        With lazy, each pattern is only compiled when a path is first
+        matched against it (see core.ResponsesMap), and warm_up()
+        compiles them all.
+        """
+
+        super().__init__(
+            [(filepath, status)],
+            engine=engine,
+            cache_size=cache_size,
+            cache_dir=cache_dir,
+            instrument=instrument,
+            max_path_length=max_path_length,
+            lazy=lazy,
+        )
 
     def get_target(self, url_path):
-        for (match, target) in self.matches:
-            result = match.fullmatch(url_path)
+        first_match = self.first_match(url_path)
+
+        if first_match:
+            index, rule, groups = first_match
+
+            # Add request query parameters
+            return self.target_url(
+                rule, groups, flask.request.query_string.decode()
+            )
+
+
+class YamlDeletedMap(ResponsesMap):
+    def __init__(
+        self,
+        filepath,
+        engine="sequential",
+        cache_size=0,
+        cache_dir=None,
+        instrument=None,
+        max_path_length=None,
+        lazy=False,
+    ):
+        """
+        Given the path to a YAML file of deleted RegEx paths like:
+
+            deleted:
+            deleted/.*/regex:
+            deleted/with/message:
+              message: "Gone, gone, gone"
+
+        Return a set of Rules, each with a compiled Regex match
+        and a template context:
+
+            [
+                Rule(<regex>, status=410),
+                Rule(<regex>, status=410),
+                Rule(<regex>, status=410, context={"message": "Gone..."}),
+            ]
+
+        Paths are loaded, matched and cached in the same way
+        as YamlRegexMap
+        """
 
-            if result:
-                parts = {}
-                for name, value in result.groupdict().items():
-                    parts[name] = value or ""
+        super().__init__(
+            [(filepath, 410)],
+            engine=engine,
+            cache_size=cache_size,
+            cache_dir=cache_dir,
+            instrument=instrument,
+            max_path_length=max_path_length,
+            lazy=lazy,
+        )
 
-                target_url = target.format(**parts)
+    def get_context(self, url_path):
+        """
+        Return a copy of the template context for a deleted path,
+        which the view callback is free to change, or None
+        """
 
-                # Add request query parameters
-                parsed_target_url = urlparse(target_url)
-                target_query = parsed_target_url.query
-                request_query = flask.request.query_string.decode()
+        first_match = self.first_match(url_path)
 
-                if request_query:
-                    if target_query:
-                        target_url = parsed_target_url._replace(
-                            query=f"{target_query}&{request_query}"
-                        ).geturl()
-                    else:
-                        target_url = parsed_target_url._replace(
-                            query=request_query
-                        ).geturl()
+        if first_match:
+            index, rule, groups = first_match
 
-                return target_url
+            return dict(rule.context)
 
 
 def _deleted_callback(context):
     return flask.render_template("410.html", **context), 410
 
 
-def prepare_redirects(path="redirects.yaml", permanent=False):
+class YamlResponsesMap(ResponsesMap):
+    def __init__(
+        self,
+        sources,
+        engine="sequential",
+        cache_size=0,
+        cache_dir=None,
+        instrument=None,
+        max_path_length=None,
+        lazy=False,
+    ):
+        """
+        Given a list of YAML files, each with the status of the
+        responses for its paths, and for deleted paths, optionally,
+        a view callback:
+
+            [
+                ("redirects.yaml", 302),
+                ("permanent-redirects.yaml", 301),
+                ("deleted.yaml", 410, deleted_callback),
+            ]
+
+        Load the rules from all the files into a single matcher,
+        so each path is looked up once (see core.ResponsesMap).
+        A path gets the response for the first rule it matches,
+        in the order of the files, then the order of the paths
+        within each file.
+
+        The engine, cache_size, cache_dir, instrument, max_path_length
+        and lazy options work as in YamlRegexMap.
+        """
+
+        self.callbacks = [
+            callback[0] if callback else _deleted_callback
+            for path, status, *callback in sources
+        ]
+
+        super().__init__(
+            [(path, status) for path, status, *callback in sources],
+            engine=engine,
+            cache_size=cache_size,
+            cache_dir=cache_dir,
+            instrument=instrument,
+            max_path_length=max_path_length,
+            lazy=lazy,
+        )
+
+    def get_response(self, url_path):
+        """
+        Return the redirect or deleted response for a path, or None
+        """
+
+        first_match = self.first_match(url_path)
+
+        if first_match:
+            index, rule, groups = first_match
+
+            if rule.status == 410:
+                view_callback = self.callbacks[self.source_index(index)]
+
+                return view_callback(dict(rule.context))
+
+            target_url = self.target_url(
+                rule, groups, flask.request.query_string.decode()
+            )
+
+            return flask.redirect(target_url, code=rule.status)
+
+
+def _map_getter(map_class, path, reload_interval, **options):
+    """
+    Return a function returning the map for the path, which is reloaded
+    when any of its files change if there is a reload_interval
+    """
+
+    return map_getter(
+        lambda: map_class(path, **options), path, reload_interval
+    )
+
+
+def prepare_redirects(
+    path="redirects.yaml",
+    permanent=False,
+    engine="sequential",
+    cache_size=0,
+    reload_interval=None,
+    cache_dir=None,
+    instrument=None,
+    max_path_length=None,
+    lazy=False,
+):
     """
     Create a regex map from the provided yaml file,
     and return a view function "apply_redirects" which encloses
     the maps to return a 302 redirect where relevant.
 
+    The path can also be a directory, a glob or a list of paths, to
+    serve the redirects from all the files with a single lookup. Files
+    are read in the order given, with the files in a directory or
+    matching a glob sorted by path, and a path repeated in a later
+    file is logged as a warning, as the first file wins.
+
+    Set engine="combined" to match all the redirects in a single
+    pass over a few merged patterns, and cache_size to remember
+    the matches for that many recent paths (see YamlRegexMap).
+
+    With a reload_interval, the file is checked for changes at most
+    every reload_interval seconds, and reloaded in the background
+    when it has changed (see core.FileReloader).
+
+    With a cache_dir, the parsed YAML is cached in that directory,
+    so later startups with the same file skip parsing it.
+
+    With an instrument, every lookup is timed and reported to it as
+    instrument(rule, seconds, location), with the (filepath, line) of
+    the rule, or a rule and location of None for paths which matched
+    nothing. A core.MatchStats counts the hits for each rule,
+    the misses, and a histogram of the lookup times, e.g. to find
+    rules which are never used. Without one, nothing is measured.
+
+    With a max_path_length, longer paths are never matched. Python's
+    re has no timeout, so this bounds the time a crafted path can
+    take in a pattern which backtracks badly, such as "(a+)+", which
+    is also logged as a warning when the file is loaded.
+
+    With lazy=True, no pattern is compiled at startup, only when a
+    request first needs it, so a new worker starts in about the time
+    it takes to read the file. Call get_redirect_map().warm_up() to
+    compile them all anyway, e.g. before forking workers.
+
+    The "get_redirect_map" attribute of the returned function
+    returns the current map, e.g. for its matcher.cache_info().
+
     Usage:
         import flask
         from canonicalwebteam.yaml_responses.flask import prepare_redirects
@@ -91,7 +290,18 @@ def prepare_redirects(path="redirects.yaml", permanent=False):
         ))
     """
 
-    redirect_map = YamlRegexMap(path)
+    get_redirect_map = _map_getter(
+        YamlRegexMap,
+        path,
+        reload_interval,
+        engine=engine,
+        cache_size=cache_size,
+        cache_dir=cache_dir,
+        status=301 if permanent else 302,
+        instrument=instrument,
+        max_path_length=max_path_length,
+        lazy=lazy,
+    )
 
     def _apply_redirects():
         """
@@ -100,21 +310,38 @@ def prepare_redirects(path="redirects.yaml", permanent=False):
         to send the appropriate redirect responses
         """
 
-        redirect_url = redirect_map.get_target(flask.request.path)
+        redirect_url = get_redirect_map().get_target(flask.request.path)
 
         return_code = 301 if permanent else 302
 
         if redirect_url:
             return flask.redirect(redirect_url, code=return_code)
 
+    _apply_redirects.get_redirect_map = get_redirect_map
+
     return _apply_redirects
 
 
-def prepare_deleted(path="deleted.yaml", view_callback=_deleted_callback):
+def prepare_deleted(
+    path="deleted.yaml",
+    view_callback=_deleted_callback,
+    engine="sequential",
+    cache_size=0,
+    reload_interval=None,
+    cache_dir=None,
+    instrument=None,
+    max_path_length=None,
+    lazy=False,
+):
     """
     Handlers to return 410 responses for deleted URLs loaded from
     deleted.yaml
 
+    The path, engine, cache_size, reload_interval, cache_dir,
+    instrument, max_path_length and lazy options work as in
+    prepare_redirects, and the "get_deleted_map" attribute of the
+    returned function returns the current map.
+
     Basic usage:
         import flask
         from canonicalwebteam.yaml_responses.flask import prepare_deleted
@@ -135,30 +362,99 @@ def prepare_deleted(path="deleted.yaml", view_callback=_deleted_callback):
         )
     """
 
-    deleted_urls = {}
-
-    if os.path.isfile(path):
-        with open(path) as deleted_file:
-            deleted_urls = yaml.load(deleted_file, Loader=ordereddict.CLoader)
+    get_deleted_map = _map_getter(
+        YamlDeletedMap,
+        path,
+        reload_interval,
+        engine=engine,
+        cache_size=cache_size,
+        cache_dir=cache_dir,
+        instrument=instrument,
+        max_path_length=max_path_length,
+        lazy=lazy,
+    )
 
     def _show_deleted():
         """
-        Process the two mappings defined above
-        of permanent and temporary redirects to target URLs,
-        to send the appropriate redirect responses
+        Check the requested path against the deleted mappings
+        and return the deleted view where relevant
         """
 
-        if deleted_urls:
-            for url_match, context in deleted_urls.items():
-                url_match = str(url_match)
+        context = get_deleted_map().get_context(flask.request.path)
 
-                if url_match[0] != "/":
-                    url_match = "/" + url_match
+        if context is not None:
+            return view_callback(context)
 
-                if not context:
-                    context = {}
-
-                if re.compile(url_match).fullmatch(flask.request.path):
-                    return view_callback(context)
+    _show_deleted.get_deleted_map = get_deleted_map
 
     return _show_deleted
+
+
+def prepare_responses(
+    sources=(("redirects.yaml", 302), ("deleted.yaml", 410)),
+    engine="sequential",
+    cache_size=0,
+    reload_interval=None,
+    cache_dir=None,
+    instrument=None,
+    max_path_length=None,
+    lazy=False,
+):
+    """
+    Return a single view function for redirects and deleted paths
+    from several YAML files, in place of separate prepare_redirects
+    and prepare_deleted functions, so each request is only matched
+    once (see YamlResponsesMap).
+
+    Each source is a (path, status) pair, where the status is 410 for
+    deleted paths or a redirect status such as 301 or 302. Deleted
+    sources can add a view callback, as for prepare_deleted. The first
+    matching path wins, in the order of the sources.
+
+    The engine, cache_size, reload_interval, cache_dir, instrument,
+    max_path_length and lazy options work as in prepare_redirects,
+    with every file checked for changes, and the "get_responses_map"
+    attribute of the returned function returns the current map.
+
+    Usage:
+        import flask
+        from canonicalwebteam.yaml_responses.flask import prepare_responses
+        app = flask.Flask(__name__)
+        app.before_request(
+            prepare_responses(
+                [
+                    ("redirects.yaml", 302),
+                    ("permanent-redirects.yaml", 301),
+                    ("deleted.yaml", 410),
+                ]
+            )
+        )
+    """
+
+    sources = list(sources)
+
+    def build():
+        return YamlResponsesMap(
+            sources,
+            engine=engine,
+            cache_size=cache_size,
+            cache_dir=cache_dir,
+            instrument=instrument,
+            max_path_length=max_path_length,
+            lazy=lazy,
+        )
+
+    get_responses_map = map_getter(
+        build, [source[0] for source in sources], reload_interval
+    )
+
+    def _respond():
+        """
+        Return the redirect or deleted response for the requested path
+        """
+
+        return get_responses_map().get_response(flask.request.path)
+
+    _respond.get_responses_map = get_responses_map
+
+    return _respond
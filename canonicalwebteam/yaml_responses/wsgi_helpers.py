@@ -0,0 +1,125 @@
+# Standard library
+from http import HTTPStatus
+
+# Local
+from canonicalwebteam.yaml_responses.core import (
+    REDIRECT_STATUSES,
+    quote_location,
+    responses_map_getter,
+)
+
+
+STATUS_LINES = {
+    status: f"{status} {HTTPStatus(status).phrase}"
+    for status in REDIRECT_STATUSES + (410,)
+}
+
+
+def _wsgi_text(value):
+    """
+    Decode a string from the environ, which holds the raw bytes
+    of the request as latin-1, from UTF-8
+    """
+
+    return value.encode("latin-1").decode("utf-8", "replace")
+
+
+def _deleted_response(environ, start_response, context):
+    body = str(context.get("message", "Gone")).encode("utf-8")
+
+    start_response(
+        STATUS_LINES[410],
+        [
+            ("Content-Type", "text/plain; charset=utf-8"),
+            ("Content-Length", str(len(body))),
+        ],
+    )
+
+    return [body]
+
+
+class YamlResponsesMiddleware:
+    def __init__(
+        self,
+        app,
+        sources=(("redirects.yaml", 302), ("deleted.yaml", 410)),
+        view_callback=_deleted_response,
+        engine="sequential",
+        cache_size=0,
+        reload_interval=None,
+        cache_dir=None,
+        instrument=None,
+        max_path_length=None,
+        lazy=False,
+    ):
+        """
+        WSGI middleware which serves redirects and deleted paths, from
+        a list of (path, status) YAML files as for the Flask
+        prepare_responses, in front of any WSGI app:
+
+            application = YamlResponsesMiddleware(
+                application,
+                [
+                    ("redirects.yaml", 302),
+                    ("permanent-redirects.yaml", 301),
+                    ("deleted.yaml", 410),
+                ],
+            )
+
+        The path and query string are read straight from the environ,
+        so matching requests never reach the app or its framework.
+        Other requests are passed on to the app unchanged.
+
+        Deleted paths return a plain text 410 response, with the
+        "message" from the context if there is one. For anything else,
+        pass a view_callback, which is called as
+        view_callback(environ, start_response, context), like a WSGI
+        app.
+
+        The engine, cache_size, reload_interval, cache_dir, instrument,
+        max_path_length and lazy options work as for the Flask
+        prepare_redirects.
+        """
+
+        self.app = app
+        self.view_callback = view_callback
+        self.get_responses_map = responses_map_getter(
+            list(sources),
+            reload_interval=reload_interval,
+            engine=engine,
+            cache_size=cache_size,
+            cache_dir=cache_dir,
+            instrument=instrument,
+            max_path_length=max_path_length,
+            lazy=lazy,
+        )
+
+    def __call__(self, environ, start_response):
+        responses_map = self.get_responses_map()
+
+        url_path = _wsgi_text(environ.get("PATH_INFO", ""))
+        first_match = responses_map.first_match(url_path or "/")
+
+        if not first_match:
+            return self.app(environ, start_response)
+
+        index, rule, groups = first_match
+
+        if rule.status == 410:
+            return self.view_callback(
+                environ, start_response, dict(rule.context)
+            )
+
+        target_url = responses_map.target_url(
+            rule, groups, _wsgi_text(environ.get("QUERY_STRING", ""))
+        )
+
+        start_response(
+            STATUS_LINES[rule.status],
+            [
+                ("Location", quote_location(target_url)),
+                ("Content-Length", "0"),
+            ],
+        )
+
+        return [b""]
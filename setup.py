@@ -14,6 +14,11 @@ setup(
     ),
     install_requires=["pyyaml", "yamlloader"],
     extras_require={"django": ["Django"], "flask": ["flask"]},
+    entry_points={
+        "console_scripts": [
+            "yaml-responses = canonicalwebteam.yaml_responses.cli:main"
+        ]
+    },
     tests_require=["Django", "flask", "pyyaml", "yamlloader"],
     test_suite="tests",
 )
@@ -0,0 +1,22 @@
+# Core
+import os
+
+# Packages
+from django.conf.urls import url
+from django.http import HttpResponse
+from canonicalwebteam.yaml_responses.django_helpers import (
+    create_deleted_pattern,
+    create_redirect_pattern,
+)
+
+
+parent_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+# Add redirects and deleted paths
+urlpatterns = [
+    create_redirect_pattern(path=f"{parent_dir}/redirects.yaml"),
+    create_deleted_pattern(path=f"{parent_dir}/deleted.yaml"),
+]
+
+# Standard patterns
+urlpatterns += [url("homepage", lambda request: HttpResponse("hello world"))]
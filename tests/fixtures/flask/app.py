@@ -8,6 +8,7 @@ from flask import Flask, render_template
 from canonicalwebteam.yaml_responses.flask_helpers import (
     prepare_deleted,
     prepare_redirects,
+    prepare_responses,
 )
 
 
@@ -25,6 +26,9 @@ app_permanent_redirects = Flask(
 app_empty_redirects = Flask(
     "empty_redirects", template_folder=f"{this_dir}/templates"
 )
+app_cached_redirects = Flask(
+    "cached_redirects", template_folder=f"{this_dir}/templates"
+)
 app_deleted = Flask("deleted", template_folder=f"{this_dir}/templates")
 app_empty_deleted = Flask(
     "empty_deleted", template_folder=f"{this_dir}/templates"
@@ -33,12 +37,18 @@ app_deleted_callback = Flask(
     "deleted_callback", template_folder=f"{this_dir}/templates"
 )
 
+app_responses = Flask("responses", template_folder=f"{this_dir}/templates")
+
 app_redirects.before_request(
     prepare_redirects(path=f"{parent_dir}/redirects.yaml")
 )
 app_permanent_redirects.before_request(
     prepare_redirects(path=f"{parent_dir}/redirects.yaml", permanent=True)
 )
+cached_redirects = prepare_redirects(
+    path=f"{parent_dir}/redirects.yaml", cache_size=10
+)
+app_cached_redirects.before_request(cached_redirects)
 app_deleted.before_request(prepare_deleted(path=f"{parent_dir}/deleted.yaml"))
 app_deleted_callback.before_request(
     prepare_deleted(path=f"{parent_dir}/deleted.yaml", view_callback=callback)
@@ -50,8 +60,18 @@ app_empty_deleted.before_request(
     prepare_deleted(path=f"{parent_dir}/empty.yaml")
 )
 
+responses = prepare_responses(
+    [
+        (f"{parent_dir}/redirects.yaml", 302),
+        (f"{parent_dir}/permanent-redirects.yaml", 301),
+        (f"{parent_dir}/deleted.yaml", 410, callback),
+    ]
+)
+app_responses.before_request(responses)
+
 
 @app_redirects.route("/homepage")
 @app_deleted.route("/homepage")
+@app_responses.route("/homepage")
 def homepage():
     return "hello world"
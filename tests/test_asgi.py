@@ -0,0 +1,249 @@
+# Core
+import asyncio
+import os
+import tempfile
+import unittest
+
+# Local
+from canonicalwebteam.yaml_responses.asgi_helpers import (
+    AsyncFileReloader,
+    YamlResponsesMiddleware,
+)
+
+
+this_dir = os.path.dirname(os.path.realpath(__file__))
+
+
+async def app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"hello world"})
+
+
+async def deleted_callback(scope, receive, send, context):
+    await send({"type": "http.response.start", "status": 410, "headers": []})
+    await send({"type": "http.response.body", "body": b"custom callback"})
+
+
+async def request(middleware, path, query_string=b""):
+    """
+    Return the status, headers and body of a GET request
+    """
+
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": path,
+        "query_string": query_string,
+        "headers": [],
+    }
+    await middleware(scope, receive, send)
+
+    return (
+        messages[0]["status"],
+        dict(messages[0]["headers"]),
+        messages[1]["body"],
+    )
+
+
+class TestAsgiMiddleware(unittest.TestCase):
+    def setUp(self):
+        self.middleware = YamlResponsesMiddleware(
+            app,
+            [
+                (f"{this_dir}/fixtures/redirects.yaml", 302),
+                (f"{this_dir}/fixtures/permanent-redirects.yaml", 301),
+                (f"{this_dir}/fixtures/deleted.yaml", 410),
+            ],
+        )
+
+    def _get(self, path, query_string=b"", middleware=None):
+        return asyncio.run(
+            request(middleware or self.middleware, path, query_string)
+        )
+
+    def test_redirects(self):
+        status, headers, body = self._get("/hello-query", b"name=world")
+
+        self.assertEqual(status, 302)
+        self.assertEqual(
+            headers[b"location"], b"/world?query=query&name=world"
+        )
+
+        status, headers, body = self._get("/moved")
+
+        self.assertEqual(status, 301)
+        self.assertEqual(headers[b"location"], b"/new-home")
+
+    def test_non_ascii_redirect(self):
+        status, headers, body = self._get("/example-café")
+
+        self.assertEqual(headers[b"location"], b"http://example.com/caf%C3%A9")
+
+        status, headers, body = self._get(
+            "/hello-query", "name=é".encode("utf-8")
+        )
+
+        self.assertEqual(
+            headers[b"location"], b"/world?query=query&name=%C3%A9"
+        )
+
+    def test_unsafe_location(self):
+        """
+        Spaces and control characters captured from the decoded path
+        should be percent-encoded, so they can't split the response
+        """
+
+        with tempfile.NamedTemporaryFile("w", suffix=".yaml") as rules_file:
+            rules_file.write(
+                "example-(?P<name>[^/]+): http://example.com/{name}\n"
+            )
+            rules_file.flush()
+            middleware = YamlResponsesMiddleware(app, [(rules_file.name, 302)])
+
+        status, headers, body = self._get(
+            "/example-x\r\nSet-Cookie: a=b", middleware=middleware
+        )
+
+        self.assertEqual(
+            headers[b"location"],
+            b"http://example.com/x%0D%0ASet-Cookie:%20a=b",
+        )
+
+    def test_deleted(self):
+        status, headers, body = self._get("/deleted")
+
+        self.assertEqual(status, 410)
+        self.assertEqual(body, b"Gone")
+
+    def test_deleted_callback(self):
+        middleware = YamlResponsesMiddleware(
+            app,
+            [(f"{this_dir}/fixtures/deleted.yaml", 410)],
+            view_callback=deleted_callback,
+        )
+
+        status, headers, body = self._get("/deleted", middleware=middleware)
+
+        self.assertEqual(body, b"custom callback")
+
+    def test_not_found(self):
+        status, headers, body = self._get("/deleted/missing")
+
+        self.assertEqual(status, 200)
+        self.assertEqual(body, b"hello world")
+
+    def test_other_scopes(self):
+        """
+        Anything other than HTTP, like lifespan events,
+        should go straight to the app
+        """
+
+        scopes = []
+
+        async def lifespan_app(scope, receive, send):
+            scopes.append(scope["type"])
+
+        middleware = YamlResponsesMiddleware(
+            lifespan_app, [(f"{this_dir}/fixtures/deleted.yaml", 410)]
+        )
+        asyncio.run(middleware({"type": "lifespan"}, None, None))
+
+        self.assertEqual(scopes, ["lifespan"])
+
+    def test_reload(self):
+        """
+        With a reload_interval, changed files should be reloaded
+        in the executor and swapped in once built
+        """
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "redirects.yaml")
+
+            with open(path, "w") as redirects_file:
+                redirects_file.write("old: /first\n")
+
+            middleware = YamlResponsesMiddleware(
+                app, [(path, 302)], reload_interval=0
+            )
+
+            async def reload():
+                first = await request(middleware, "/old")
+
+                with open(path, "w") as redirects_file:
+                    redirects_file.write("old: /second-version\n")
+
+                during = await request(middleware, "/old")
+                await middleware.reloader.future
+
+                return first, during, await request(middleware, "/old")
+
+            first, during, after = asyncio.run(reload())
+
+        self.assertEqual(first[1][b"location"], b"/first")
+        self.assertEqual(during[1][b"location"], b"/first")
+        self.assertEqual(after[1][b"location"], b"/second-version")
+
+
+class TestAsyncFileReloader(unittest.TestCase):
+    def test_unchanged(self):
+        """
+        When the file hasn't changed, no reload should be started
+        """
+
+        with tempfile.NamedTemporaryFile("w", suffix=".txt") as rules_file:
+            reloader = AsyncFileReloader(
+                rules_file.name, lambda path: "built", interval=0
+            )
+
+            self.assertEqual(asyncio.run(reloader.get_async()), "built")
+            self.assertIsNone(reloader.future)
+            self.assertFalse(reloader._reloading)
+
+    def test_cancelled_check(self):
+        """
+        A request cancelled while the file is checked shouldn't stop
+        later requests from reloading it
+        """
+
+        with tempfile.NamedTemporaryFile("w", suffix=".txt") as rules_file:
+            reloader = AsyncFileReloader(
+                rules_file.name, lambda path: "built", interval=0
+            )
+
+            async def cancel_check():
+                task = asyncio.ensure_future(reloader.get_async())
+                await asyncio.sleep(0)
+                task.cancel()
+
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+
+            asyncio.run(cancel_check())
+
+            self.assertFalse(reloader._reloading)
+
+            rules_file.write("changed")
+            rules_file.flush()
+            reloader.build = lambda path: "rebuilt"
+
+            async def reload():
+                await reloader.get_async()
+                await reloader.future
+
+                return await reloader.get_async()
+
+            self.assertEqual(asyncio.run(reload()), "rebuilt")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,230 @@
+# Core
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stderr, redirect_stdout
+from io import StringIO
+from unittest import mock
+
+# Local
+from canonicalwebteam.yaml_responses import core
+from canonicalwebteam.yaml_responses.cli import main
+
+
+this_dir = os.path.dirname(os.path.realpath(__file__))
+
+
+class TestBuildCache(unittest.TestCase):
+    def test_build_cache(self):
+        """
+        The cache built by the build-cache command should be used
+        by load_rules, without parsing the YAML again
+        """
+
+        redirects_path = f"{this_dir}/fixtures/redirects.yaml"
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            with redirect_stdout(StringIO()):
+                status = main(
+                    ["build-cache", "--cache-dir", cache_dir, redirects_path]
+                )
+
+            self.assertEqual(status, 0)
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+
+            with mock.patch.object(core, "parse_rules") as parse_rules:
+                rules = core.load_rules(redirects_path, cache_dir=cache_dir)
+
+            parse_rules.assert_not_called()
+            self.assertEqual(rules, core.load_rules(redirects_path))
+
+
+class TestConvert(unittest.TestCase):
+    def test_convert(self):
+        """
+        Converted rule files should load the same rules as the source
+        """
+
+        redirects_path = f"{this_dir}/fixtures/redirects.yaml"
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for filename in ["redirects.jsonl", "redirects.rules"]:
+                path = os.path.join(tmp_dir, filename)
+
+                with redirect_stdout(StringIO()):
+                    self.assertEqual(
+                        main(["convert", redirects_path, path]), 0
+                    )
+
+                self.assertEqual(
+                    [rule[:2] for rule in core.load_rules(path)],
+                    [rule[:2] for rule in core.load_rules(redirects_path)],
+                )
+
+    def test_missing_source(self):
+        with redirect_stderr(StringIO()):
+            status = main(["convert", "/tmp/non-existent.yaml", "out.rules"])
+
+        self.assertEqual(status, 1)
+
+
+class TestValidate(unittest.TestCase):
+    def test_validate(self):
+        """
+        The validate command should list every invalid pattern,
+        and fail only when there are some
+        """
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "redirects.yaml")
+
+            with open(path, "w") as rules_file:
+                rules_file.write("broken/(: /a\nvalid: /b\nalso/[: /c\n")
+
+            stderr = StringIO()
+
+            with redirect_stderr(stderr):
+                status = main(["validate", "--jobs", "1", path])
+
+            self.assertEqual(status, 1)
+            self.assertEqual(
+                [
+                    line.split(": ")[0]
+                    for line in stderr.getvalue().splitlines()
+                ],
+                [f"{path}:1", f"{path}:3"],
+            )
+
+        self.assertEqual(
+            main(["validate", f"{this_dir}/fixtures/redirects.yaml"]), 0
+        )
+
+    def test_check_backtracking(self):
+        """
+        Patterns which could backtrack catastrophically should only
+        fail validation when asked for
+        """
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "redirects.yaml")
+
+            with open(path, "w") as rules_file:
+                rules_file.write("docs(/[\\w-]+)*: /a\nslow/(a+)+: /b\n")
+
+            self.assertEqual(main(["validate", path]), 0)
+
+            stderr = StringIO()
+
+            with redirect_stderr(stderr):
+                status = main(["validate", "--check-backtracking", path])
+
+            self.assertEqual(status, 1)
+            self.assertEqual(
+                stderr.getvalue(),
+                f"{path}:2: slow/(a+)+: "
+                "may backtrack catastrophically at (a+)+\n",
+            )
+
+
+class TestAnalyze(unittest.TestCase):
+    def test_analyze(self):
+        """
+        The analyze command should report duplicated, shadowed,
+        chained and looping rules, and write the files without them
+        """
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            redirects_path = os.path.join(tmp_dir, "redirects.yaml")
+            deleted_path = os.path.join(tmp_dir, "deleted.yaml")
+            output_dir = os.path.join(tmp_dir, "optimized")
+
+            with open(redirects_path, "w") as rules_file:
+                rules_file.write(
+                    "a: /b?x=1\n"
+                    "b: /c\n"
+                    "c: https://example.com/c\n"
+                    "docs/.*: /documentation\n"
+                    "docs/install: /install\n"
+                    "loop-a: /loop-b\n"
+                    "loop-b: /loop-a\n"
+                    "old: /gone\n"
+                )
+
+            with open(deleted_path, "w") as rules_file:
+                rules_file.write("gone:\nc:\n")
+
+            stdout = StringIO()
+
+            with redirect_stdout(stdout), redirect_stderr(StringIO()):
+                status = main(
+                    [
+                        "analyze",
+                        "--check",
+                        "--output-dir",
+                        output_dir,
+                        redirects_path,
+                        f"{deleted_path}:410",
+                    ]
+                )
+
+            self.assertEqual(status, 1)
+            self.assertEqual(
+                [
+                    line.split(": ")[0]
+                    for line in stdout.getvalue().split("\n")
+                ],
+                [
+                    f"{deleted_path}:2",
+                    f"{redirects_path}:5",
+                    f"{redirects_path}:1",
+                    f"{redirects_path}:2",
+                    f"{redirects_path}:8",
+                    f"{redirects_path}:6",
+                    f"{redirects_path}:7",
+                    "",
+                ],
+            )
+            self.assertIn("https://example.com/c?x=1", stdout.getvalue())
+
+            self.assertEqual(
+                core.load_rules(os.path.join(output_dir, "redirects.yaml")),
+                [
+                    ("a", "https://example.com/c?x=1", 1),
+                    ("b", "https://example.com/c", 2),
+                    ("c", "https://example.com/c", 3),
+                    ("docs/.*", "/documentation", 4),
+                    ("loop-a", "/loop-b", 5),
+                    ("loop-b", "/loop-a", 6),
+                    ("old", "/gone", 7),
+                ],
+            )
+            self.assertEqual(
+                core.load_rules(os.path.join(output_dir, "deleted.yaml")),
+                [("gone", None, 1)],
+            )
+
+            with redirect_stdout(StringIO()):
+                self.assertEqual(main(["analyze", redirects_path]), 0)
+
+    def test_deleted_without_status(self):
+        """
+        Analyzing deleted paths as redirects, without ":410", should
+        report each rule which has no target, rather than crash
+        """
+
+        deleted_path = f"{this_dir}/fixtures/deleted.yaml"
+        stderr = StringIO()
+
+        with redirect_stdout(StringIO()), redirect_stderr(stderr):
+            status = main(["analyze", deleted_path])
+
+        self.assertEqual(status, 1)
+        self.assertIn(
+            f"{deleted_path}:3: deleted/with/message: "
+            "redirect target must be a string, not dict",
+            stderr.getvalue(),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,1002 @@
+# Core
+import gc
+import os
+import re
+import tempfile
+import threading
+import unittest
+from urllib.parse import urlparse
+
+# Packages
+import yaml
+
+# Local
+from canonicalwebteam.yaml_responses.core import (
+    CombinedMatcher,
+    FileReloader,
+    EMPTY_CONTEXT,
+    IndexedMatcher,
+    InvalidRulesError,
+    LazyPattern,
+    MatchStats,
+    ResponsesMap,
+    Rule,
+    RuleSet,
+    SequentialMatcher,
+    TargetTemplate,
+    backtracking_risk,
+    first_segment,
+    is_literal,
+    load_rules,
+    normalize_pattern,
+    parse_rules,
+    prefork,
+    root_pattern,
+    rule_file_paths,
+    validate_rules,
+    watched_paths,
+    write_rules,
+)
+
+
+this_dir = os.path.dirname(os.path.realpath(__file__))
+
+
+def _compile(mappings):
+    return [Rule(re.compile(pattern), value) for pattern, value in mappings]
+
+
+def _target(first_match):
+    """
+    Replace the rule in the result of first_match with its target
+    """
+
+    if first_match:
+        index, rule, groups = first_match
+
+        return index, rule.target, groups
+
+
+class TestLoadRules(unittest.TestCase):
+    def test_load_rules(self):
+        self.assertEqual(
+            load_rules(f"{this_dir}/fixtures/deleted.yaml"),
+            [
+                ("deleted", None, 1),
+                ("deleted/.*/regex", None, 2),
+                ("deleted/with/message", {"message": "Gone, gone, gone"}, 3),
+            ],
+        )
+        self.assertEqual(load_rules(f"{this_dir}/fixtures/empty.yaml"), [])
+        self.assertEqual(load_rules("/tmp/non-existent-file.yaml"), [])
+
+    def test_repeated_path(self):
+        """
+        A repeated path should keep its first position
+        and take its last value, as in a dictionary
+        """
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "redirects.yaml")
+
+            with open(path, "w") as rules_file:
+                rules_file.write("a: /first\nb: /b\na: /second\n")
+
+            self.assertEqual(
+                load_rules(path), [("a", "/second", 3), ("b", "/b", 2)]
+            )
+
+    def test_yaml_features(self):
+        """
+        Aliases between paths, and merge keys, including a top-level
+        merge key which can't be read one path at a time, should load
+        as they would from the whole document
+        """
+
+        self.assertEqual(
+            parse_rules(
+                b"a: &context {message: Gone}\n"
+                b"b: *context\n"
+                b"c: {<<: *context, extra: [1, 2]}\n"
+            ),
+            [
+                ("a", {"message": "Gone"}, 1),
+                ("b", {"message": "Gone"}, 2),
+                ("c", {"message": "Gone", "extra": [1, 2]}, 3),
+            ],
+        )
+        self.assertEqual(
+            parse_rules(b"a: /a\n<<: {a: /merged, b: /b}\n"),
+            [("a", "/a", 1), ("b", "/b", 2)],
+        )
+
+        with self.assertRaises(yaml.YAMLError):
+            parse_rules(b"a: /a\n---\nb: /b\n")
+
+    def test_formats(self):
+        """
+        Rules written as JSON Lines or precompiled rules should load
+        the same as the YAML they were written from
+        """
+
+        rules = load_rules(f"{this_dir}/fixtures/deleted.yaml")
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for filename in ["rules.jsonl", "rules.rules", "rules.yaml"]:
+                path = os.path.join(tmp_dir, filename)
+                write_rules(path, rules)
+
+                with self.subTest(filename=filename):
+                    self.assertEqual(
+                        [rule[:2] for rule in load_rules(path)],
+                        [rule[:2] for rule in rules],
+                    )
+
+            self.assertEqual(
+                load_rules(os.path.join(tmp_dir, "rules.rules")), rules
+            )
+
+            path = os.path.join(tmp_dir, "redirects.jsonl")
+
+            with open(path, "w") as rules_file:
+                rules_file.write('["a", "/first"]\n\n["a", "/second"]\n')
+
+            self.assertEqual(load_rules(path), [("a", "/second", 3)])
+
+    def test_outdated_binary_rules(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "redirects.rules")
+
+            with open(path, "wb") as rules_file:
+                rules_file.write(b"yaml-responses 1 4\n")
+
+            with self.assertRaises(ValueError):
+                load_rules(path)
+
+    def test_cache(self):
+        """
+        With a cache_dir, the rules should be stored on the first load,
+        and stay the same when loaded from the cache
+        """
+
+        deleted_path = f"{this_dir}/fixtures/deleted.yaml"
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            rules = load_rules(deleted_path, cache_dir=cache_dir)
+            cache_files = os.listdir(cache_dir)
+            cached_rules = load_rules(deleted_path, cache_dir=cache_dir)
+
+        self.assertEqual(len(cache_files), 1)
+        self.assertEqual(cached_rules, rules)
+        self.assertIs(type(cached_rules[2][1]), dict)
+
+
+class TestRuleSet(unittest.TestCase):
+    def test_shared_values(self):
+        """
+        Rules should share equal targets, and all empty contexts
+        """
+
+        pattern = re.compile("/old")
+        rules = RuleSet(
+            [
+                Rule(pattern, "".join(["/new", "-page"]), 302),
+                Rule(pattern, "".join(["/new", "-page"]), 301),
+                Rule(pattern, status=410, context={}),
+                Rule(pattern, status=410, context={"message": "Gone"}),
+            ]
+        )
+
+        self.assertEqual(len(rules), 4)
+        self.assertIs(rules[0].target, rules[1].target)
+        self.assertIs(rules[0].context, EMPTY_CONTEXT)
+        self.assertIs(rules[2].context, EMPTY_CONTEXT)
+        self.assertIsNone(rules[3].target)
+        self.assertEqual(rules[3].context, {"message": "Gone"})
+
+        with self.assertRaises(AttributeError):
+            rules[0].extra = "value"
+
+
+class TestCombinedMatcher(unittest.TestCase):
+    mappings = [
+        ("/hello", "/world"),
+        ("/docs/(?P<page>.*)", "/documentation/{page}"),
+        ("/docs/special", "/never-reached"),
+        ("/blog/(?P<page>[a-z]+)(/(?P<year>[0-9]+))?", "/b/{page}/{year}"),
+        ("/(?P<word>[a-z]+)-(?P=word)", "/repeated/{word}"),
+        ("(?i)/case", "/insensitive"),
+        ("/catch/(.*)", "/caught"),
+    ]
+    paths = [
+        "/hello",
+        "/hello/",
+        "/docs/",
+        "/docs/special",
+        "/blog/post",
+        "/blog/post/2021",
+        "/blog/Post",
+        "/abc-abc",
+        "/abc-abd",
+        "/CASE",
+        "/catch/anything",
+        "/missing",
+    ]
+
+    def test_same_as_sequential(self):
+        """
+        The combined engine should find the same first match, with the
+        same named groups, as trying each pattern in turn
+        """
+
+        matches = _compile(self.mappings)
+        sequential = SequentialMatcher(matches)
+
+        for chunk_size in [1, 2, 3, 500]:
+            combined = CombinedMatcher(matches, chunk_size=chunk_size)
+
+            for path in self.paths:
+                self.assertEqual(
+                    combined.first_match(path),
+                    sequential.first_match(path),
+                    f"{path} (chunk_size={chunk_size})",
+                )
+
+    def test_unmergeable_patterns(self):
+        """
+        Back-references and global flags can't be merged,
+        so they should be kept as patterns of their own
+        """
+
+        combined = CombinedMatcher(_compile(self.mappings))
+        single_patterns = [
+            single[1].target for *_, single in combined.chunks if single
+        ]
+
+        self.assertEqual(single_patterns, ["/repeated/{word}", "/insensitive"])
+        self.assertEqual(len(combined.chunks), 4)
+
+
+class TestIndexedMatcher(unittest.TestCase):
+    mappings = [
+        ("/about", "/about-us"),
+        ("/docs/(?P<page>.*)", "/documentation/{page}"),
+        ("/docs/shadowed", "/never-reached"),
+        ("/pricing", "/plans"),
+    ]
+
+    def test_is_literal(self):
+        self.assertTrue(is_literal("/about/old-page"))
+        self.assertTrue(is_literal("/with spaces_and-dashes"))
+        self.assertFalse(is_literal("/file.html"))
+        self.assertFalse(is_literal("/docs/(?P<page>.*)"))
+        self.assertFalse(is_literal("/docs/?"))
+
+    def test_literal_index(self):
+        """
+        Literal paths should be kept out of the RegEx engine
+        """
+
+        for engine in ["sequential", "combined"]:
+            matcher = IndexedMatcher(_compile(self.mappings), engine=engine)
+
+            self.assertEqual(
+                sorted(matcher.literals),
+                ["/about", "/docs/shadowed", "/pricing"],
+            )
+            self.assertEqual(list(matcher.segments), ["docs"])
+            self.assertIsNone(matcher.unsegmented)
+            self.assertEqual(
+                _target(matcher.first_match("/about")), (0, "/about-us", {})
+            )
+            self.assertEqual(
+                _target(matcher.first_match("/pricing")), (3, "/plans", {})
+            )
+            self.assertIsNone(matcher.first_match("/missing"))
+
+    def test_first_segment(self):
+        self.assertEqual(first_segment("/docs/(?P<page>.*)"), "docs")
+        self.assertEqual(first_segment("/blog/?"), "blog")
+        self.assertEqual(first_segment("/tutorials/.+/[0-9]+"), "tutorials")
+        self.assertIsNone(first_segment("/(docs|blog)/.*"))
+        self.assertIsNone(first_segment("/docs/a|/blog/b"))
+        self.assertIsNone(first_segment("/docs/?more"))
+        self.assertIsNone(first_segment("/docs.*"))
+        self.assertIsNone(first_segment("/.*"))
+
+    def test_backtracking_risk(self):
+        self.assertEqual(backtracking_risk("/(a+)+b"), "(a+)+")
+        self.assertEqual(backtracking_risk("/x/(.*)*"), "(.*)*")
+        self.assertEqual(backtracking_risk("/((a+)a){2,}"), "((a+)a){2,}")
+        self.assertEqual(backtracking_risk("/(a|ab)*c"), "(a|ab)*")
+        self.assertEqual(backtracking_risk("/(?:.|x)+"), "(?:.|x)+")
+        self.assertIsNone(backtracking_risk("/docs/(?P<page>.*)"))
+        self.assertIsNone(backtracking_risk("/(docs|blog)/.*"))
+        self.assertIsNone(backtracking_risk("/(?:a|b)+"))
+        self.assertIsNone(backtracking_risk("/(a+)?"))
+        self.assertIsNone(backtracking_risk(r"/docs(/[\w-]+)*"))
+        self.assertIsNone(backtracking_risk("/([^/]+/)*end"))
+        self.assertIsNone(backtracking_risk("/(?:[a-z]+-)+x"))
+        self.assertIsNone(backtracking_risk(r"/(\.[a-z]+)*"))
+        self.assertEqual(backtracking_risk("/docs(/.+)*"), "(/.+)*")
+        self.assertEqual(backtracking_risk("/(/?a+)*"), "(/?a+)*")
+        self.assertEqual(backtracking_risk("/(.+/)*"), "(.+/)*")
+        self.assertEqual(backtracking_risk("/(a+/?)*"), "(a+/?)*")
+        self.assertEqual(backtracking_risk("/(a+a)*"), "(a+a)*")
+        self.assertEqual(backtracking_risk("/(a+(b)?)*"), "(a+(b)?)*")
+        self.assertIsNone(backtracking_risk(r"/\(a+\)+"))
+        self.assertIsNone(backtracking_risk("/(?#(a+)+)a+"))
+
+    def test_root_pattern(self):
+        self.assertEqual(root_pattern("hello"), "/hello")
+        self.assertEqual(root_pattern("docs/(a|b)"), "/docs/(a|b)")
+        self.assertEqual(root_pattern("a|b"), "/(?:a|b)")
+        self.assertEqual(root_pattern("(?i)case"), "(?i)/case")
+
+    def test_normalize_pattern(self):
+        self.assertEqual(normalize_pattern("/hello"), "/hello")
+        self.assertEqual(normalize_pattern("hello"), "/hello")
+        self.assertEqual(normalize_pattern("a|b"), "/(?:a|b)")
+
+    def test_segment_priority(self):
+        """
+        Patterns for a path's segment and patterns without a segment
+        should be tried in their original order
+        """
+
+        mappings = [
+            ("/(?P<any>.*)/shadowed", "/any"),
+            ("/docs/(?P<page>.*)", "/documentation/{page}"),
+            ("/docs/special", "/docs-literal"),
+            ("/.*", "/fallback"),
+            ("/blog/(?P<post>.*)", "/never-reached"),
+        ]
+        paths = [
+            "/docs/shadowed",
+            "/docs/page",
+            "/docs/special",
+            "/blog/post",
+            "/blog/shadowed",
+            "/pricing",
+        ]
+
+        rules = _compile(mappings)
+
+        for engine in ["sequential", "combined"]:
+            matcher = IndexedMatcher(rules, engine=engine)
+            sequential = SequentialMatcher(rules)
+
+            self.assertEqual(sorted(matcher.segments), ["blog", "docs"])
+
+            for path in paths:
+                self.assertEqual(
+                    matcher.first_match(path),
+                    sequential.first_match(path),
+                    f"{path} ({engine})",
+                )
+
+    def test_cache(self):
+        """
+        With a cache_size, repeated paths should be served from the cache,
+        including paths which don't match
+        """
+
+        matcher = IndexedMatcher(_compile(self.mappings), cache_size=2)
+
+        for path in ["/docs/page", "/missing", "/docs/page", "/missing"]:
+            matcher.first_match(path)
+
+        self.assertEqual(
+            _target(matcher.first_match("/about")), (0, "/about-us", {})
+        )
+        self.assertEqual(matcher.cache_info().hits, 2)
+        self.assertEqual(matcher.cache_info().misses, 3)
+        self.assertEqual(matcher.cache_info().currsize, 2)
+
+        matcher.cache_clear()
+
+        self.assertEqual(matcher.cache_info().currsize, 0)
+        self.assertIsNone(IndexedMatcher([]).cache_info())
+
+    def test_literal_priority(self):
+        """
+        A literal after a RegEx which matches the same path should lose
+        """
+
+        for engine in ["sequential", "combined"]:
+            matcher = IndexedMatcher(_compile(self.mappings), engine=engine)
+
+            self.assertEqual(
+                _target(matcher.first_match("/docs/shadowed")),
+                (1, "/documentation/{page}", {"page": "shadowed"}),
+            )
+
+
+class TestTargetTemplate(unittest.TestCase):
+    targets = [
+        "/world",
+        "/",
+        "/docs/{page}",
+        "/docs/{page}?from={source}",
+        "/search?q={query}&lang=en",
+        "/{page}",
+        "/page?",
+        "http://example.com/{name}",
+        "https://example.com?ref={name}",
+        "HTTPS://example.com/{name}",
+        "/page#{name}",
+        "/page;{name}",
+        "/{{literal}}/{name}",
+        "/{0}",
+    ]
+    values = [None, "", "value", "/", "a?b", "a#b", "a;b", "a b"]
+
+    def _parsed(self, target, groups, query_string):
+        """
+        How targets were rendered before TargetTemplate
+        """
+
+        parts = {name: value or "" for name, value in groups.items()}
+        target_url = target.format(**parts)
+        parsed_target_url = urlparse(target_url)
+        target_query = parsed_target_url.query
+
+        if query_string:
+            if target_query:
+                query_string = f"{target_query}&{query_string}"
+
+            target_url = parsed_target_url._replace(
+                query=query_string
+            ).geturl()
+
+        return target_url
+
+    def test_same_as_parsed(self):
+        """
+        Templates should render exactly the same URLs as
+        formatting and parsing each target
+        """
+
+        for target in self.targets:
+            template = TargetTemplate(target)
+
+            for value in self.values:
+                groups = {"page": value, "source": "old", "query": value}
+                groups["name"] = value
+
+                for query_string in ["", "a=1", "a=1&b=2"]:
+                    try:
+                        expected = self._parsed(target, groups, query_string)
+                    except IndexError:
+                        with self.assertRaises(IndexError):
+                            template.render(groups, query_string)
+                        continue
+
+                    self.assertEqual(
+                        template.render(groups, query_string),
+                        expected,
+                        f"{target} {groups} {query_string}",
+                    )
+
+    def test_parsed_once(self):
+        """
+        Plain targets should be split into literal text and names,
+        with the query kept apart
+        """
+
+        template = TargetTemplate("/docs/{page}?from={source}")
+
+        self.assertEqual(
+            template.pieces, ["/docs/", "page", "?from=", "source", ""]
+        )
+        self.assertEqual(template.query_index, 2)
+        self.assertTrue(template.mergeable)
+        self.assertFalse(TargetTemplate("/page#{name}").mergeable)
+        self.assertIsNone(TargetTemplate("/{0}").pieces)
+
+
+class TestResponsesMap(unittest.TestCase):
+    def setUp(self):
+        self.responses_map = ResponsesMap(
+            [
+                (f"{this_dir}/fixtures/redirects.yaml", 302),
+                (f"{this_dir}/fixtures/permanent-redirects.yaml", 301),
+                (f"{this_dir}/fixtures/deleted.yaml", 410),
+            ]
+        )
+
+    def test_first_match(self):
+        """
+        Rules from every file should be matched, with earlier files
+        winning, without any web framework
+        """
+
+        index, rule, groups = self.responses_map.first_match("/hello")
+        self.assertEqual((index, rule.status, rule.target), (0, 302, "/world"))
+
+        index, rule, groups = self.responses_map.first_match("/moved")
+        self.assertEqual(self.responses_map.source_index(index), 1)
+        self.assertEqual(rule.status, 301)
+
+        index, rule, groups = self.responses_map.first_match(
+            "/deleted/with/message"
+        )
+        self.assertEqual(rule.status, 301)
+
+        index, rule, groups = self.responses_map.first_match("/deleted")
+        self.assertEqual(self.responses_map.source_index(index), 2)
+        self.assertEqual(rule.status, 410)
+        self.assertEqual(
+            self.responses_map.location(index),
+            (f"{this_dir}/fixtures/deleted.yaml", 1),
+        )
+
+        self.assertIsNone(self.responses_map.first_match("/missing"))
+
+    def test_target_url(self):
+        index, rule, groups = self.responses_map.first_match("/example-robin")
+
+        self.assertEqual(
+            self.responses_map.target_url(rule, groups, "a=1"),
+            "http://example.com/robin?a=1",
+        )
+
+    def test_unsupported_status(self):
+        with self.assertRaises(ValueError):
+            ResponsesMap([(f"{this_dir}/fixtures/redirects.yaml", 200)])
+
+    def test_merged_files(self):
+        """
+        A directory, glob or list of files should be merged into one
+        map in a fixed order, with paths repeated across files logged
+        """
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for name, content in [
+                ("b.yaml", "b: /from-b\nshared: /from-b\n"),
+                ("a.yaml", "a: /from-a\nshared: /from-a\n"),
+                ("notes.txt", "a: /never-read\n"),
+            ]:
+                with open(os.path.join(tmp_dir, name), "w") as rules_file:
+                    rules_file.write(content)
+
+            self.assertEqual(
+                rule_file_paths([tmp_dir, f"{tmp_dir}/b.*"]),
+                [f"{tmp_dir}/a.yaml", f"{tmp_dir}/b.yaml"],
+            )
+            self.assertEqual(
+                watched_paths(f"{tmp_dir}/*.yaml"),
+                [tmp_dir, f"{tmp_dir}/a.yaml", f"{tmp_dir}/b.yaml"],
+            )
+
+            with self.assertLogs("canonicalwebteam.yaml_responses") as logs:
+                responses_map = ResponsesMap([(tmp_dir, 302)])
+
+        self.assertEqual(
+            [rule.target for rule in responses_map.rules],
+            ["/from-a", "/from-a", "/from-b", "/from-b"],
+        )
+        self.assertEqual(responses_map.starts, [0])
+        self.assertEqual(
+            [responses_map.location(index) for index in range(4)],
+            [
+                (f"{tmp_dir}/a.yaml", 1),
+                (f"{tmp_dir}/a.yaml", 2),
+                (f"{tmp_dir}/b.yaml", 1),
+                (f"{tmp_dir}/b.yaml", 2),
+            ],
+        )
+        self.assertIn(f"{tmp_dir}/b.yaml:2 repeats", logs.output[0])
+        self.assertIn(f"from {tmp_dir}/a.yaml:2", logs.output[0])
+
+
+class TestLazyPattern(unittest.TestCase):
+    sources = [
+        (f"{this_dir}/fixtures/redirects.yaml", 302),
+        (f"{this_dir}/fixtures/permanent-redirects.yaml", 301),
+        (f"{this_dir}/fixtures/deleted.yaml", 410),
+    ]
+    paths = [
+        "/hello",
+        "/moved",
+        "/example-robin",
+        "/deleted/with/message",
+        "/deleted",
+        "/missing",
+    ]
+
+    def _compiled(self, responses_map):
+        return [
+            rule.pattern.pattern
+            for rule in responses_map.rules
+            if rule.pattern._compiled is not None
+        ]
+
+    def test_lazy(self):
+        """
+        A lazy map should match like an eager one, only compiling
+        the patterns which paths were matched against
+        """
+
+        for engine in ["sequential", "combined"]:
+            with self.subTest(engine=engine):
+                eager_map = ResponsesMap(self.sources, engine=engine)
+                lazy_map = ResponsesMap(self.sources, engine=engine, lazy=True)
+
+                self.assertIsInstance(lazy_map.rules[0].pattern, LazyPattern)
+                self.assertEqual(self._compiled(lazy_map), [])
+
+                # Found in the literal index
+                lazy_map.first_match("/hello")
+                self.assertEqual(self._compiled(lazy_map), [])
+
+                for path in self.paths:
+                    self.assertEqual(
+                        _target(lazy_map.first_match(path)),
+                        _target(eager_map.first_match(path)),
+                    )
+
+                compiled = self._compiled(lazy_map)
+                self.assertTrue(compiled)
+                self.assertTrue(all(not is_literal(p) for p in compiled))
+
+                lazy_map.warm_up()
+                self.assertGreater(
+                    len(self._compiled(lazy_map)), len(compiled)
+                )
+                self.assertIsNone(lazy_map.first_match("/missing"))
+
+    def test_invalid_pattern(self):
+        """
+        Invalid patterns aren't checked when loading lazily,
+        so should be logged once needed, and never match
+        """
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "redirects.yaml")
+
+            with open(path, "w") as rules_file:
+                rules_file.write("broken/(: /a\nvalid/.*: /b\n")
+
+            responses_map = ResponsesMap([(path, 302)], lazy=True)
+
+        with self.assertLogs("canonicalwebteam.yaml_responses"):
+            self.assertIsNone(responses_map.first_match("/broken/("))
+
+        self.assertEqual(
+            _target(responses_map.first_match("/valid/page")), (1, "/b", {})
+        )
+
+    def test_compiled_once(self):
+        """
+        Threads matching against a new pattern at the same time
+        should share a single compiled pattern
+        """
+
+        pattern = LazyPattern("/docs/(?P<page>.*)")
+        results = []
+
+        def compile_pattern():
+            results.append(pattern.compile())
+
+        threads = [threading.Thread(target=compile_pattern) for _ in "1234"]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len({id(result) for result in results}), 1)
+        self.assertEqual(pattern.fullmatch("/docs/a")["page"], "a")
+
+
+class TestMatchStats(unittest.TestCase):
+    def test_match_stats(self):
+        """
+        Each lookup should be counted as a hit for the rule's file and
+        line, or as a miss, and timed
+        """
+
+        redirects_path = f"{this_dir}/fixtures/redirects.yaml"
+        stats = MatchStats(buckets=[0.5, float("inf")])
+        responses_map = ResponsesMap([(redirects_path, 302)], instrument=stats)
+
+        for url_path in ["/hello", "/hello", "/example-robin", "/missing"]:
+            responses_map.first_match(url_path)
+
+        self.assertEqual(
+            stats.hits, {(redirects_path, 1): 2, (redirects_path, 3): 1}
+        )
+        self.assertEqual(stats.misses, 1)
+
+        samples = stats.samples()
+
+        self.assertEqual(
+            samples[0],
+            (
+                "yaml_responses_rule_hits_total",
+                {"file": redirects_path, "line": "1"},
+                2,
+            ),
+        )
+        self.assertIn(("yaml_responses_misses_total", {}, 1), samples)
+        self.assertIn(
+            ("yaml_responses_match_seconds_bucket", {"le": "+Inf"}, 4),
+            samples,
+        )
+        self.assertIn(("yaml_responses_match_seconds_count", {}, 4), samples)
+
+    def test_disabled(self):
+        """
+        Without an instrument, lookups shouldn't be wrapped at all
+        """
+
+        responses_map = ResponsesMap(
+            [(f"{this_dir}/fixtures/redirects.yaml", 302)]
+        )
+
+        self.assertNotIn("first_match", vars(responses_map))
+
+
+class TestValidateRules(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.paths = []
+
+        for name, content in [
+            ("a.yaml", "valid: /a\nbroken/(: /a\n"),
+            ("b.yaml", "also/[: /b\nvalid/.*: /b\n"),
+        ]:
+            path = os.path.join(self.tmp_dir.name, name)
+            self.paths.append(path)
+
+            with open(path, "w") as rules_file:
+                rules_file.write(content)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_validate_rules(self):
+        """
+        Every invalid pattern should be reported, in order, with its
+        file and line, whether checked here or in a pool of processes
+        """
+
+        for processes in [1, 2]:
+            with self.subTest(processes=processes):
+                errors = validate_rules(
+                    self.tmp_dir.name, processes=processes, shard_size=1
+                )
+
+                self.assertEqual(
+                    [error[:3] for error in errors],
+                    [
+                        (self.paths[0], 2, "broken/("),
+                        (self.paths[1], 1, "also/["),
+                    ],
+                )
+
+    def test_backtracking(self):
+        """
+        Patterns which could backtrack catastrophically should be
+        logged when loaded, and reported by validate_rules if asked
+        """
+
+        path = os.path.join(self.tmp_dir.name, "slow.yaml")
+
+        with open(path, "w") as rules_file:
+            rules_file.write("fine/.*: /a\nslow/(a+)+b: /b\n")
+
+        self.assertEqual(validate_rules(path), [])
+        self.assertEqual(
+            validate_rules(path, backtracking=True),
+            [
+                (
+                    path,
+                    2,
+                    "slow/(a+)+b",
+                    "may backtrack catastrophically at (a+)+",
+                )
+            ],
+        )
+
+        with self.assertLogs("canonicalwebteam.yaml_responses") as logs:
+            responses_map = ResponsesMap([(path, 302)], max_path_length=30)
+
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn(f"{path}:2: /slow/(a+)+b", logs.output[0])
+
+        # Too long to match, however slowly
+        self.assertIsNone(responses_map.first_match("/slow/" + "a" * 50))
+        self.assertIsNotNone(responses_map.first_match("/slow/aab"))
+
+    def test_invalid_rules_error(self):
+        """
+        Building a map should report the invalid patterns from all
+        the files at once, as a re.error
+        """
+
+        with self.assertRaises(re.error) as context:
+            ResponsesMap([(self.paths[0], 302), (self.paths[1], 410)])
+
+        self.assertIsInstance(context.exception, InvalidRulesError)
+        self.assertEqual(len(context.exception.errors), 2)
+        self.assertIn(f"{self.paths[1]}:1: also/[", str(context.exception))
+
+    def test_redirect_without_target(self):
+        """
+        Reading deleted paths as redirects should report each rule
+        without a string target, rather than fail on the first
+        """
+
+        deleted_path = f"{this_dir}/fixtures/deleted.yaml"
+
+        with self.assertRaises(InvalidRulesError) as context:
+            ResponsesMap([(deleted_path, 302)])
+
+        self.assertEqual(
+            [error[:3] for error in context.exception.errors],
+            [
+                (deleted_path, 1, "deleted"),
+                (deleted_path, 2, "deleted/.*/regex"),
+                (deleted_path, 3, "deleted/with/message"),
+            ],
+        )
+        self.assertIn(
+            "redirect target must be a string, not dict",
+            context.exception.errors[2][3],
+        )
+
+
+class TestFileReloader(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "rules.txt")
+        self._write("first")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _write(self, content):
+        tmp_path = self.path + ".tmp"
+
+        with open(tmp_path, "w") as tmp_file:
+            tmp_file.write(content)
+
+        os.replace(tmp_path, self.path)
+
+    def _build(self, path):
+        with open(path) as rules_file:
+            content = rules_file.read()
+
+        if content == "broken":
+            raise ValueError("Broken rules")
+
+        return content
+
+    def test_reload(self):
+        """
+        When the file changes, get() should swap in the new version
+        once it has been built in the background
+        """
+
+        reloader = FileReloader(self.path, self._build, interval=0)
+
+        self.assertEqual(reloader.get(), "first")
+        self.assertIsNone(reloader.thread)
+
+        self._write("second")
+        reloader.get()
+        reloader.thread.join()
+
+        self.assertEqual(reloader.get(), "second")
+
+    def test_reload_paths(self):
+        """
+        With a list of paths, a change to any of the files
+        should rebuild the object
+        """
+
+        other_path = os.path.join(self.tmp_dir.name, "other.txt")
+
+        with open(other_path, "w") as other_file:
+            other_file.write("other")
+
+        reloader = FileReloader(
+            [self.path, other_path],
+            lambda paths: [self._build(path) for path in paths],
+            interval=0,
+        )
+
+        self.assertEqual(reloader.get(), ["first", "other"])
+
+        with open(other_path, "a") as other_file:
+            other_file.write(" changed")
+
+        reloader.get()
+        reloader.thread.join()
+
+        self.assertEqual(reloader.get(), ["first", "other changed"])
+
+    def test_added_file(self):
+        """
+        Files added to a watched directory should be loaded, and
+        then watched for changes themselves
+        """
+
+        rules_dir = os.path.join(self.tmp_dir.name, "redirects")
+        os.mkdir(rules_dir)
+
+        with open(os.path.join(rules_dir, "a.yaml"), "w") as rules_file:
+            rules_file.write("a: /a\n")
+
+        reloader = FileReloader(
+            rules_dir, lambda path: ResponsesMap([(path, 302)]), interval=0
+        )
+
+        for name, content in [("b.yaml", "b: /b\n"), ("b.yaml", "c: /c\n")]:
+            with open(os.path.join(rules_dir, name), "a") as rules_file:
+                rules_file.write(content)
+
+            reloader.get()
+            reloader.thread.join()
+
+        self.assertEqual(
+            [rule.target for rule in reloader.get().rules], ["/a", "/b", "/c"]
+        )
+
+    def test_interval(self):
+        """
+        The file shouldn't be checked more than once per interval
+        """
+
+        reloader = FileReloader(self.path, self._build, interval=3600)
+
+        self._write("second")
+
+        self.assertEqual(reloader.get(), "first")
+        self.assertIsNone(reloader.thread)
+
+    def test_failed_reload(self):
+        """
+        If the new file can't be built, the previous version should be
+        kept and the error logged
+        """
+
+        reloader = FileReloader(self.path, self._build, interval=0)
+
+        self._write("broken")
+
+        with self.assertLogs("canonicalwebteam.yaml_responses.core"):
+            reloader.get()
+            reloader.thread.join()
+
+        self.assertEqual(reloader.get(), "first")
+
+
+class TestPrefork(unittest.TestCase):
+    def tearDown(self):
+        gc.unfreeze()
+
+    def test_prefork(self):
+        """
+        Matchers built before prefork() should no longer be examined
+        by the garbage collector
+        """
+
+        matcher = IndexedMatcher(_compile(TestIndexedMatcher.mappings))
+
+        prefork()
+
+        self.assertGreater(gc.get_freeze_count(), 0)
+        self.assertFalse(
+            any(item is matcher.rules for item in gc.get_objects())
+        )
+        self.assertEqual(
+            _target(matcher.first_match("/about")), (0, "/about-us", {})
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
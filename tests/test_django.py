@@ -5,13 +5,18 @@ import unittest
 # Packages
 import django
 from django.conf import settings
-from django.test import Client
+from django.http import HttpResponse, HttpResponseGone
+from django.test import Client, RequestFactory
 from django.test.utils import override_settings
 
 # Local
+from canonicalwebteam.yaml_responses.core import MatchStats
 from canonicalwebteam.yaml_responses.django_helpers import (
-    create_redirect_views,
+    create_deleted_pattern,
     create_deleted_views,
+    create_redirect_pattern,
+    create_redirect_views,
+    YamlResponsesMiddleware,
 )
 
 
@@ -40,6 +45,21 @@ class TestDjangoRedirects(unittest.TestCase):
             create_redirect_views(path="/tmp/non-existent-file.yaml"), []
         )
 
+    def test_literal_paths_grouped(self):
+        """
+        Consecutive literal paths should share a single URL pattern,
+        keeping their place before the following RegEx paths
+        """
+
+        urlpatterns = create_redirect_views(
+            path=f"{this_dir}/fixtures/redirects.yaml"
+        )
+
+        self.assertEqual(len(urlpatterns), 2)
+        self.assertEqual(
+            sorted(urlpatterns[0].views), ["hello", "hello-query"]
+        )
+
     @override_settings(ROOT_URLCONF="tests.fixtures.django.redirects_urls")
     def test_not_found(self):
         """
@@ -79,9 +99,13 @@ class TestDjangoRedirects(unittest.TestCase):
         django_client = Client()
 
         redirect = django_client.get("/hello?name=world")
+        redirect_query = django_client.get("/hello-query?name=world")
 
         self.assertEqual(redirect.status_code, 302)
         self.assertEqual(redirect.get("Location"), "/world?name=world")
+        self.assertEqual(
+            redirect_query.get("Location"), "/world?query=query&name=world"
+        )
 
     @override_settings(
         ROOT_URLCONF="tests.fixtures.django.permanent_redirects_urls"
@@ -229,5 +253,181 @@ class TestDjangoDeleted(unittest.TestCase):
         self.assertEqual(redirect.content, b"custom callback")
 
 
+class TestDjangoIndexedPatterns(unittest.TestCase):
+    def test_missing_file(self):
+        """
+        When given a non-existent file path,
+        create_redirect_pattern should return a pattern matching nothing
+        """
+
+        pattern = create_redirect_pattern(path="/tmp/non-existent-file.yaml")
+
+        self.assertIsNone(pattern.resolve("hello"))
+
+    @override_settings(ROOT_URLCONF="tests.fixtures.django.indexed_urls")
+    def test_redirects(self):
+        """
+        The single redirects pattern should redirect literal and
+        RegEx paths, keeping the query string
+        """
+
+        django_client = Client()
+
+        redirect = django_client.get("/hello?name=world")
+        regex_redirect = django_client.get("/example-robin")
+
+        self.assertEqual(redirect.status_code, 302)
+        self.assertEqual(redirect.get("Location"), "/world?name=world")
+        self.assertEqual(regex_redirect.status_code, 302)
+        self.assertEqual(
+            regex_redirect.get("Location"), "http://example.com/robin"
+        )
+
+    @override_settings(ROOT_URLCONF="tests.fixtures.django.indexed_urls")
+    def test_permanent_redirect(self):
+        pattern = create_redirect_pattern(
+            path=f"{this_dir}/fixtures/redirects.yaml", permanent=True
+        )
+        request = RequestFactory().get("/hello")
+
+        redirect = pattern.resolve("hello").func(request)
+
+        self.assertEqual(redirect.status_code, 301)
+        self.assertEqual(redirect.get("Location"), "/world")
+
+    @override_settings(ROOT_URLCONF="tests.fixtures.django.indexed_urls")
+    def test_deleted(self):
+        django_client = Client()
+
+        deleted = django_client.get("/deleted/nonsense/regex")
+        message = django_client.get("/deleted/with/message")
+
+        self.assertEqual(deleted.status_code, 410)
+        self.assertEqual(deleted.content, b"page deleted")
+        self.assertEqual(message.status_code, 410)
+        self.assertEqual(message.content, b"Gone, gone, gone")
+
+    @override_settings(ROOT_URLCONF="tests.fixtures.django.indexed_urls")
+    def test_not_found(self):
+        django_client = Client()
+
+        missing = django_client.get("/deleted/missing")
+
+        self.assertEqual(missing.status_code, 404)
+        self.assertEqual(
+            django_client.get("/homepage").content, b"hello world"
+        )
+
+    def test_view_callback(self):
+        """
+        The view callback should get the same arguments
+        as with create_deleted_views
+        """
+
+        pattern = create_deleted_pattern(
+            path=f"{this_dir}/fixtures/deleted.yaml",
+            view_callback=lambda *args, **kwargs: (args[1:], kwargs),
+        )
+        request = RequestFactory().get("/deleted")
+
+        self.assertEqual(
+            pattern.resolve("deleted").func(request), ((None, {}), {})
+        )
+        self.assertEqual(
+            pattern.resolve("deleted/with/message").func(request),
+            (({"message": "Gone, gone, gone"}, {}), {}),
+        )
+
+
+def deleted_callback(request, url_mapping, settings, *args, **kwargs):
+    return HttpResponseGone(f"custom callback {url_mapping}")
+
+
+match_stats = MatchStats()
+
+
+class TestDjangoMiddleware(unittest.TestCase):
+    responses_settings = {
+        "redirects": f"{this_dir}/fixtures/redirects.yaml",
+        "permanent_redirects": f"{this_dir}/fixtures/permanent-redirects.yaml",
+        "deleted": f"{this_dir}/fixtures/deleted.yaml",
+        "deleted_callback": "tests.test_django.deleted_callback",
+    }
+
+    def _get(self, path):
+        with override_settings(YAML_RESPONSES=self.responses_settings):
+            middleware = YamlResponsesMiddleware(
+                lambda request: HttpResponse("view")
+            )
+
+        return middleware(RequestFactory().get(path))
+
+    def test_redirects(self):
+        """
+        Redirects should be returned before the view, with the query
+        string added to the target's query
+        """
+
+        redirect = self._get("/hello-query?name=world")
+        regex_redirect = self._get("/example-robin")
+        permanent = self._get("/moved")
+
+        self.assertEqual(redirect.status_code, 302)
+        self.assertEqual(redirect["Location"], "/world?query=query&name=world")
+        self.assertEqual(
+            regex_redirect["Location"], "http://example.com/robin"
+        )
+        self.assertEqual(permanent.status_code, 301)
+        self.assertEqual(permanent["Location"], "/new-home")
+
+    def test_deleted(self):
+        deleted = self._get("/deleted/nonsense/regex")
+        message = self._get("/deleted/with/message")
+
+        self.assertEqual(deleted.status_code, 410)
+        self.assertEqual(deleted.content, b"custom callback None")
+        # Shadowed by permanent-redirects.yaml
+        self.assertEqual(message.status_code, 301)
+
+    def test_not_found(self):
+        self.assertEqual(self._get("/deleted/missing").content, b"view")
+
+    def test_instrument(self):
+        """
+        An instrument given by its import path should see every lookup
+        """
+
+        self.responses_settings = {
+            **self.responses_settings,
+            "instrument": "tests.test_django.match_stats",
+        }
+        self._get("/hello")
+        self._get("/deleted/missing")
+
+        self.assertEqual(sum(match_stats.hits.values()), 1)
+        self.assertEqual(match_stats.misses, 1)
+
+    @override_settings(ROOT_URLCONF="tests.fixtures.django.deleted_urls")
+    def test_default_settings(self):
+        """
+        Without YAML_RESPONSES, the middleware should read redirects.yaml
+        and deleted.yaml, rendering 410.html for deleted paths
+        """
+
+        cwd = os.getcwd()
+        os.chdir(f"{this_dir}/fixtures")
+
+        try:
+            middleware = YamlResponsesMiddleware(None)
+        finally:
+            os.chdir(cwd)
+
+        deleted = middleware(RequestFactory().get("/deleted/with/message"))
+
+        self.assertEqual(len(middleware.get_responses_map().rules), 6)
+        self.assertEqual(deleted.status_code, 410)
+        self.assertEqual(deleted.content, b"Gone, gone, gone")
+
+
 if __name__ == "__main__":
     unittest.main()
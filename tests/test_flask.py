@@ -2,18 +2,27 @@
 import os
 import unittest
 
+# Packages
+import flask
+
 # Local
 from canonicalwebteam.yaml_responses.flask_helpers import (
     prepare_deleted,
     prepare_redirects,
+    prepare_responses,
+    YamlDeletedMap,
 )
 from tests.fixtures.flask.app import (
+    app_cached_redirects,
     app_redirects,
+    cached_redirects,
     app_permanent_redirects,
     app_empty_redirects,
     app_empty_deleted,
     app_deleted,
     app_deleted_callback,
+    app_responses,
+    responses,
 )
 
 
@@ -118,6 +127,53 @@ class TestFlaskRedirects(unittest.TestCase):
             peter_redirect.headers.get("Location"), "http://example.com/peter"
         )
 
+    def test_cached_redirect(self):
+        """
+        When Flask has cached redirects, check repeated requests
+        are served from the cache, still with their own query strings
+        """
+
+        redirect_map = cached_redirects.get_redirect_map()
+        app = app_cached_redirects.test_client()
+
+        redirect = app.get("/example-robin")
+        redirect_query = app.get("/example-robin?name=world")
+
+        self.assertEqual(
+            redirect.headers.get("Location"), "http://example.com/robin"
+        )
+        self.assertEqual(
+            redirect_query.headers.get("Location"),
+            "http://example.com/robin?name=world",
+        )
+        self.assertEqual(redirect_map.matcher.cache_info().hits, 1)
+
+    def test_multiple_files(self):
+        """
+        Redirects from a list of files should be served by one handler,
+        with the first file winning
+        """
+
+        app = flask.Flask(__name__)
+        app.before_request(
+            prepare_redirects(
+                path=[
+                    f"{this_dir}/fixtures/redirects.yaml",
+                    f"{this_dir}/fixtures/permanent-redirects.yaml",
+                ]
+            )
+        )
+        client = app.test_client()
+
+        self.assertEqual(
+            client.get("/hello").headers.get("Location"),
+            "http://localhost/world",
+        )
+        self.assertEqual(
+            client.get("/moved").headers.get("Location"),
+            "http://localhost/new-home",
+        )
+
     def test_homepage_view(self):
         """
         When Flask has redirects from redirects.yaml
@@ -155,6 +211,22 @@ class TestFlaskDeleted(unittest.TestCase):
 
         prepare_deleted(path="{this_dir}/fixtures/empty.yaml")
 
+    def test_deleted_map(self):
+        """
+        YamlDeletedMap should compile the deleted paths once,
+        and return the context for matching paths only
+        """
+
+        deleted_map = YamlDeletedMap(f"{this_dir}/fixtures/deleted.yaml")
+
+        self.assertEqual(len(deleted_map.rules), 3)
+        self.assertEqual(deleted_map.get_context("/deleted"), {})
+        self.assertEqual(
+            deleted_map.get_context("/deleted/with/message"),
+            {"message": "Gone, gone, gone"},
+        )
+        self.assertIsNone(deleted_map.get_context("/deleted/missing"))
+
     def test_not_found(self):
         """
         When Flask has deleteds, check 404s still work
@@ -227,5 +299,80 @@ class TestFlaskDeleted(unittest.TestCase):
         self.assertEqual(deleted_callback.data, b"custom callback")
 
 
+class TestFlaskResponses(unittest.TestCase):
+    def setUp(self):
+        """
+        Set up Flask app for testing
+        """
+
+        self.app_responses = app_responses.test_client()
+
+    def test_missing_file(self):
+        """
+        When given non-existent file paths,
+        prepare_responses should not error
+        """
+
+        prepare_responses([("/tmp/non-existent-file.yaml", 302)])
+
+    def test_unsupported_status(self):
+        with self.assertRaises(ValueError):
+            prepare_responses([(f"{this_dir}/fixtures/redirects.yaml", 200)])
+
+    def test_responses(self):
+        """
+        Each file's paths should get the response for that file's status
+        """
+
+        redirect = self.app_responses.get("/hello?name=world")
+        permanent = self.app_responses.get("/moved")
+        deleted = self.app_responses.get("/deleted/nonsense/regex")
+        missing = self.app_responses.get("/deleted/missing")
+
+        self.assertEqual(redirect.status_code, 302)
+        self.assertEqual(
+            redirect.headers.get("Location"),
+            "http://localhost/world?name=world",
+        )
+        self.assertEqual(permanent.status_code, 301)
+        self.assertEqual(
+            permanent.headers.get("Location"), "http://localhost/new-home"
+        )
+        self.assertEqual(deleted.status_code, 410)
+        self.assertEqual(deleted.data, b"custom callback")
+        self.assertEqual(missing.status_code, 404)
+        self.assertEqual(
+            self.app_responses.get("/homepage").data, b"hello world"
+        )
+
+    def test_precedence(self):
+        """
+        A path in an earlier file should win over the later files
+        """
+
+        redirect = self.app_responses.get("/hello")
+        permanent = self.app_responses.get("/deleted/with/message")
+
+        self.assertEqual(redirect.status_code, 302)
+        self.assertEqual(
+            redirect.headers.get("Location"), "http://localhost/world"
+        )
+        self.assertEqual(permanent.status_code, 301)
+        self.assertEqual(
+            permanent.headers.get("Location"),
+            "http://localhost/message-moved",
+        )
+
+    def test_single_matcher(self):
+        """
+        All the rules should share one matcher
+        """
+
+        responses_map = responses.get_responses_map()
+
+        self.assertEqual(len(responses_map.rules), 9)
+        self.assertEqual(responses_map.starts, [0, 3, 6])
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,155 @@
+# Core
+import os
+import tempfile
+import unittest
+
+# Local
+from canonicalwebteam.yaml_responses.wsgi_helpers import (
+    YamlResponsesMiddleware,
+)
+
+
+this_dir = os.path.dirname(os.path.realpath(__file__))
+
+
+def app(environ, start_response):
+    start_response("200 OK", [("Content-Type", "text/plain")])
+
+    return [b"hello world"]
+
+
+def deleted_callback(environ, start_response, context):
+    start_response("410 Gone", [])
+
+    return [b"custom callback"]
+
+
+class TestWsgiMiddleware(unittest.TestCase):
+    def setUp(self):
+        self.middleware = YamlResponsesMiddleware(
+            app,
+            [
+                (f"{this_dir}/fixtures/redirects.yaml", 302),
+                (f"{this_dir}/fixtures/permanent-redirects.yaml", 301),
+                (f"{this_dir}/fixtures/deleted.yaml", 410),
+            ],
+        )
+
+    def _get(self, path, query_string="", middleware=None):
+        """
+        Return the status, headers and body of a GET request
+        """
+
+        response = {}
+
+        def start_response(status, headers):
+            response["status"] = status
+            response["headers"] = dict(headers)
+
+        environ = {
+            "REQUEST_METHOD": "GET",
+            "PATH_INFO": path.encode("utf-8").decode("latin-1"),
+            "QUERY_STRING": query_string.encode("utf-8").decode("latin-1"),
+        }
+        body = b"".join(
+            (middleware or self.middleware)(environ, start_response)
+        )
+
+        return response["status"], response["headers"], body
+
+    def test_missing_file(self):
+        """
+        When given non-existent file paths,
+        the middleware should pass every request on to the app
+        """
+
+        middleware = YamlResponsesMiddleware(
+            app, [("/tmp/non-existent-file.yaml", 302)]
+        )
+
+        self.assertEqual(
+            self._get("/hello", middleware=middleware)[2], b"hello world"
+        )
+
+    def test_redirects(self):
+        status, headers, body = self._get("/hello-query", "name=world")
+
+        self.assertEqual(status, "302 Found")
+        self.assertEqual(headers["Location"], "/world?query=query&name=world")
+
+        status, headers, body = self._get("/moved")
+
+        self.assertEqual(status, "301 Moved Permanently")
+        self.assertEqual(headers["Location"], "/new-home")
+
+    def test_non_ascii_redirect(self):
+        """
+        Paths and query strings should be decoded from UTF-8, and the
+        Location header percent-encoded
+        """
+
+        status, headers, body = self._get("/example-café")
+
+        self.assertEqual(headers["Location"], "http://example.com/caf%C3%A9")
+
+        status, headers, body = self._get("/hello-query", "name=é")
+
+        self.assertEqual(headers["Location"], "/world?query=query&name=%C3%A9")
+
+    def test_unsafe_location(self):
+        """
+        Spaces and control characters captured from the decoded path
+        should be percent-encoded, so they can't split the response
+        """
+
+        with tempfile.NamedTemporaryFile("w", suffix=".yaml") as rules_file:
+            rules_file.write(
+                "example-(?P<name>[^/]+): http://example.com/{name}\n"
+            )
+            rules_file.flush()
+            middleware = YamlResponsesMiddleware(app, [(rules_file.name, 302)])
+
+        status, headers, body = self._get(
+            "/example-x\r\nSet-Cookie: a=b", middleware=middleware
+        )
+
+        self.assertEqual(
+            headers["Location"], "http://example.com/x%0D%0ASet-Cookie:%20a=b"
+        )
+
+        status, headers, body = self._get(
+            "/example-two words", middleware=middleware
+        )
+
+        self.assertEqual(headers["Location"], "http://example.com/two%20words")
+
+    def test_deleted(self):
+        status, headers, body = self._get("/deleted")
+
+        self.assertEqual(status, "410 Gone")
+        self.assertEqual(body, b"Gone")
+
+        status, headers, body = self._get("/deleted/nonsense/regex")
+
+        self.assertEqual(status, "410 Gone")
+
+    def test_deleted_callback(self):
+        middleware = YamlResponsesMiddleware(
+            app,
+            [(f"{this_dir}/fixtures/deleted.yaml", 410)],
+            view_callback=deleted_callback,
+        )
+
+        status, headers, body = self._get("/deleted", middleware=middleware)
+
+        self.assertEqual(body, b"custom callback")
+
+    def test_not_found(self):
+        status, headers, body = self._get("/deleted/missing")
+
+        self.assertEqual(status, "200 OK")
+        self.assertEqual(body, b"hello world")
+
+
+if __name__ == "__main__":
+    unittest.main()